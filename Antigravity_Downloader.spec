@@ -13,7 +13,7 @@ a = Analysis(
     hiddenimports=[
         'PIL._tkinter_finder', 'PIL', 'ctypes', 'customtkinter', 
         'yt_dlp', 'rembg', 'onnxruntime', 'cv2', 'flet', 'tkinterdnd2',
-        'librosa', 'numpy', 'matplotlib', 'sklearn.utils._typedefs', 'sklearn.neighbors._partition_nodes'
+        'librosa', 'numpy', 'sklearn.utils._typedefs', 'sklearn.neighbors._partition_nodes'
     ],
     hookspath=[],
     hooksconfig={},
@@ -15,7 +15,7 @@ import random
 # --- Dependency Management ---
 def install_dependencies():
     """Check and install missing python dependencies."""
-    required = ["customtkinter", "yt-dlp", "Pillow", "plyer", "opencv-python", "rembg", "flet", "tkinterdnd2", "librosa", "numpy", "matplotlib"]
+    required = ["customtkinter", "yt-dlp", "Pillow", "plyer", "opencv-python", "rembg", "flet", "tkinterdnd2", "librosa", "numpy"]
     missing = []
     
     import importlib.util
@@ -29,7 +29,6 @@ def install_dependencies():
     if importlib.util.find_spec("tkinterdnd2") is None: missing.append("tkinterdnd2")
     if importlib.util.find_spec("librosa") is None: missing.append("librosa")
     if importlib.util.find_spec("numpy") is None: missing.append("numpy")
-    if importlib.util.find_spec("matplotlib") is None: missing.append("matplotlib")
     
     if missing:
         print(f"Missing dependencies found: {', '.join(missing)}")
@@ -52,7 +51,7 @@ except ImportError:
     from plyer import notification
     from PIL import Image
 
-from downmess_core import DownmessCore
+from downmess_core import DownmessCore, CONVERT_PROFILES, DEFAULT_CONVERT_PROFILE, MUSIC_DIR, HISTORY_PAGE_SIZE
 
 # --- UI / Theme Settings ---
 # --- UI / Theme Settings ---
@@ -96,6 +95,89 @@ def fix_dnd_path():
 # IMPORTANTE: Llama a esta función ANTES de crear la ventana de la app
 fix_dnd_path()
 
+class VirtualList(ctk.CTkFrame):
+    """
+    Scrollable list that only builds enough row widgets to fill the viewport.
+    Rows come from create_row(parent) and are re-bound to items with
+    bind_row(row, item) as the list scrolls, so cost does not grow with len(items).
+    """
+    def __init__(self, master, row_height, create_row, bind_row, label_text=None, empty_text="", **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_height = row_height
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.items = []
+        self.rows = []
+        self.offset = 0 # Pixels scrolled from the top
+        
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        if label_text:
+            ctk.CTkLabel(self, text=label_text, font=DOWNMESS_FONT_SUB, text_color=DOWNMESS_GOLD).grid(row=0, column=0, columnspan=2, pady=(5, 0))
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=1, column=0, sticky="nsew", padx=5, pady=5)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        self.empty_label = ctk.CTkLabel(self.body, text=empty_text, text_color="gray")
+        
+        self.body.bind("<Configure>", lambda e: self._redraw())
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind_all(seq, self._on_wheel, add="+")
+
+    def set_items(self, items, empty_text=None):
+        self.items = list(items)
+        if empty_text is not None: self.empty_label.configure(text=empty_text)
+        self._scroll_to(self.offset)
+
+    def _max_offset(self):
+        return max(0, len(self.items) * self.row_height - self.body.winfo_height())
+
+    def _scroll_to(self, offset):
+        self.offset = int(min(max(0, offset), self._max_offset()))
+        self._redraw()
+
+    def _redraw(self):
+        height = max(1, self.body.winfo_height())
+        needed = height // self.row_height + 2
+        while len(self.rows) < min(needed, len(self.items)):
+            row = self.create_row(self.body)
+            row.configure(height=self.row_height - 4) # CTk widgets take their size from configure, not place()
+            row.pack_propagate(False)
+            self.rows.append(row)
+        
+        first, shift = divmod(self.offset, self.row_height)
+        for i, row in enumerate(self.rows):
+            index = first + i
+            if i < needed and index < len(self.items):
+                self.bind_row(row, self.items[index])
+                row.place(x=0, y=i * self.row_height - shift + 2, relwidth=1)
+            else:
+                row.place_forget()
+        
+        if self.items: self.empty_label.place_forget()
+        else: self.empty_label.place(relx=0.5, y=20, anchor="n")
+        
+        total = len(self.items) * self.row_height
+        if total <= height: self.scrollbar.set(0, 1)
+        else: self.scrollbar.set(self.offset / total, (self.offset + height) / total)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self._scroll_to(float(value) * len(self.items) * self.row_height)
+        elif action == "scroll":
+            step = self.body.winfo_height() if unit == "pages" else self.row_height
+            self._scroll_to(self.offset + int(value) * step)
+
+    def _on_wheel(self, event):
+        # Wheel bindings are global; only react when the pointer is over this list
+        widget = str(event.widget)
+        if widget != str(self) and not widget.startswith(str(self) + "."): return
+        if event.num == 4: direction = -1
+        elif event.num == 5: direction = 1
+        else: direction = -1 if event.delta > 0 else 1
+        self._scroll_to(self.offset + direction * self.row_height)
+
+
 class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
     def __init__(self):
         super().__init__()
@@ -310,6 +392,48 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.end_entry = ctk.CTkEntry(range_inner, placeholder_text="Fin", width=60, font=("Roboto", 12), border_color=DOWNMESS_CYAN)
         self.end_entry.pack(side="left", padx=2)
 
+        # --- Throughput (Fragment concurrency / external downloader) ---
+        frag_frame = ctk.CTkFrame(self.dl_options_frame, fg_color="transparent")
+        frag_frame.pack(side="left", padx=10)
+
+        ctk.CTkLabel(frag_frame, text="Fragmentos:", font=("Roboto", 10), text_color="gray").pack(side="top")
+        self.fragments_var = ctk.StringVar(value="Auto")
+        ctk.CTkComboBox(
+            frag_frame,
+            values=["Auto", "1", "4", "8", "16"],
+            variable=self.fragments_var,
+            width=70,
+            fg_color=DOWNMESS_OBSIDIAN,
+            border_color=DOWNMESS_GOLD,
+            button_color=DOWNMESS_GOLD,
+            dropdown_fg_color=DOWNMESS_OBSIDIAN,
+            corner_radius=0
+        ).pack()
+
+        self.aria2_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            self.dl_options_frame,
+            text="ARIA2C",
+            font=("Roboto", 10, "bold"),
+            variable=self.aria2_var,
+            progress_color=DOWNMESS_GOLD,
+            button_color=DOWNMESS_TEXT,
+            button_hover_color=DOWNMESS_GOLD,
+            fg_color=DOWNMESS_STEEL
+        ).pack(side="left", padx=10)
+
+        self.skip_dup_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            self.dl_options_frame,
+            text="OMITIR YA DESCARGADOS",
+            font=("Roboto", 10, "bold"),
+            variable=self.skip_dup_var,
+            progress_color=DOWNMESS_GOLD,
+            button_color=DOWNMESS_TEXT,
+            button_hover_color=DOWNMESS_GOLD,
+            fg_color=DOWNMESS_STEEL
+        ).pack(side="left", padx=10)
+
         # Buttons
         self.download_btn = ctk.CTkButton(
             self.dl_options_frame,
@@ -456,13 +580,17 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         formats = ["MP4", "MKV", "MOV", "MP3", "WAV", "FLAC", "OGG", "M4A", "JPG", "PNG", "WEBP", "GIF"]
         ctk.CTkComboBox(options_frame, values=formats, variable=self.format_var, width=100, font=DOWNMESS_FONT_BODY).pack(side="left", padx=10)
         
+        ctk.CTkLabel(options_frame, text="Perfil:", font=DOWNMESS_FONT_BODY).pack(side="left", padx=(10, 0))
+        self.profile_var = ctk.StringVar(value=DEFAULT_CONVERT_PROFILE)
+        ctk.CTkComboBox(options_frame, values=list(CONVERT_PROFILES), variable=self.profile_var, width=130, font=DOWNMESS_FONT_BODY).pack(side="left", padx=10)
+        
         self.norm_conv_var = ctk.BooleanVar(value=True)
         ctk.CTkSwitch(options_frame, text="Normalizar Audio", variable=self.norm_conv_var, font=DOWNMESS_FONT_BODY, progress_color=DOWNMESS_CYAN).pack(side="left", padx=20)
 
         # Main Area: Split View
         # Left: Queue List
-        self.queue_frame = ctk.CTkScrollableFrame(self.tab_converter, label_text="Cola de Archivos", label_font=DOWNMESS_FONT_SUB, fg_color=DOWNMESS_CARD)
-        self.queue_frame.grid(row=2, column=0, padx=20, pady=20, sticky="nsew")
+        self.queue_list = VirtualList(self.tab_converter, 36, self.create_queue_row, self.bind_queue_row, label_text="Cola de Archivos", fg_color=DOWNMESS_CARD)
+        self.queue_list.grid(row=2, column=0, padx=20, pady=20, sticky="nsew")
         
         # Right: Dropped Zone / Details (Empty Space Filler)
         self.details_frame = ctk.CTkFrame(self.tab_converter, fg_color=DOWNMESS_CARD, border_color="#333", border_width=1)
@@ -481,26 +609,43 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.details_frame.dnd_bind('<<Drop>>', self.on_drop_files)
         
         self.file_list = []
-        self.queue_widgets = []
+        self.conv_batch = None
         
         self.conv_status = ctk.CTkLabel(self.tab_converter, text="", text_color=DOWNMESS_CYAN, font=DOWNMESS_FONT_BODY)
-        self.conv_status.grid(row=3, column=0, columnspan=2, pady=10)
+        self.conv_status.grid(row=3, column=0, columnspan=2, pady=(10, 0))
+        
+        self.conv_progress = ctk.CTkProgressBar(
+            self.tab_converter,
+            progress_color=DOWNMESS_GOLD,
+            fg_color=DOWNMESS_STEEL,
+            height=6,
+            corner_radius=0
+        )
+        self.conv_progress.grid(row=4, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="ew")
+        self.conv_progress.set(0)
 
     def update_queue_ui(self):
-        for w in self.queue_widgets: w.destroy()
-        self.queue_widgets = []
-        
-        for f in self.file_list:
-            card = ctk.CTkFrame(self.queue_frame, fg_color="transparent", border_color="#333", border_width=1)
-            card.pack(fill="x", pady=2)
-            
-            name = os.path.basename(f)
-            ctk.CTkLabel(card, text=name, font=("Consolas", 11), anchor="w").pack(side="left", padx=5)
-            ctk.CTkButton(card, text="X", width=30, fg_color="#333", hover_color=DOWNMESS_RED, command=lambda p=f: self.remove_from_queue(p)).pack(side="right")
-            
-            self.queue_widgets.append(card)
+        self.queue_list.set_items(self.file_list)
+
+    def create_queue_row(self, parent):
+        card = ctk.CTkFrame(parent, fg_color="transparent", border_color="#333", border_width=1)
+        card.name_label = ctk.CTkLabel(card, text="", font=("Consolas", 11), anchor="w")
+        card.name_label.pack(side="left", padx=5)
+        card.remove_btn = ctk.CTkButton(card, text="X", width=30, fg_color="#333", hover_color=DOWNMESS_RED)
+        card.remove_btn.pack(side="right")
+        return card
+
+    def bind_queue_row(self, card, path):
+        card.name_label.configure(text=os.path.basename(path))
+        card.remove_btn.configure(command=lambda p=path: self.remove_from_queue(p))
             
     def remove_from_queue(self, path):
+        # During a conversion the "X" cancels that file's job
+        batch = self.conv_batch
+        if batch:
+            for job in batch.jobs:
+                if job['path'] == path: batch.cancel(job)
+            return
         if path in self.file_list:
             self.file_list.remove(path)
             self.update_queue_ui()
@@ -542,24 +687,47 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
     def run_conversion(self):
         fmt = self.format_var.get().lower()
         normalize = self.norm_conv_var.get()
+        files = list(self.file_list)
+        if not files: return
         self.convert_btn.configure(state="disabled", text="CONVIRTIENDO...")
         
-        total = len(self.file_list)
-        for i, fp in enumerate(self.file_list):
-            try:
-                self.conv_status.configure(text=f"Convirtiendo {i+1}/{total}: {os.path.basename(fp)}")
-                self.core.convert_file(fp, fmt, normalize=normalize)
-            except: pass
-        
-        self.conv_status.configure(text="¡Conversión Terminada!", text_color=DOWNMESS_GREEN)
+        # Parallel ffmpeg processes (one per core); queue "X" cancels a file
+        self.conv_jobs = {}
+        self.conv_total = len(files)
+        self.conv_progress.set(0)
+        self.conv_batch = self.core.convert_batch(files, fmt, normalize=normalize, on_update=self.on_conversion_update,
+                                                  profile=self.profile_var.get())
+        jobs = self.conv_batch.wait()
+        self.conv_batch = None
+        
+        failed = sum(1 for j in jobs if j['status'] == 'error')
+        cancelled = sum(1 for j in jobs if j['status'] == 'cancelled')
+        if failed or cancelled:
+            self.conv_status.configure(text=f"Conversión Terminada: {len(jobs) - failed - cancelled}/{len(jobs)} OK, {failed} con error, {cancelled} canceladas", text_color=DOWNMESS_RED)
+        else:
+            self.conv_status.configure(text="¡Conversión Terminada!", text_color=DOWNMESS_GREEN)
+        self.conv_progress.set(1.0)
         self.convert_btn.configure(state="normal", text="INICIAR CONVERSIÓN")
         self.file_list = []
         self.update_queue_ui()
         self.core.send_notification('Downmess', '¡Conversión Completa!')
 
+    def on_conversion_update(self, job):
+        """Called from converter threads whenever a conversion job changes."""
+        try:
+            self.conv_jobs[job['id']] = job
+            jobs = list(self.conv_jobs.values())
+            finished = sum(1 for j in jobs if j['status'] in ('done', 'error', 'cancelled'))
+            running = sum(1 for j in jobs if j['status'] == 'running')
+            overall = sum(1.0 if j['status'] in ('done', 'error', 'cancelled') else j['progress'] for j in jobs) / self.conv_total
+            self.conv_progress.set(overall)
+            self.conv_status.configure(text=f"Convirtiendo {finished}/{self.conv_total} ({running} en paralelo): {overall*100:.1f}%", text_color=DOWNMESS_CYAN)
+        except: pass
+
     def setup_history_tab(self):
         self.tab_history.grid_columnconfigure(0, weight=1)
         self.tab_history.grid_rowconfigure(1, weight=1)
+        self.history_page = 0
         
         # Header / Controls
         ctrl_frame = ctk.CTkFrame(self.tab_history, fg_color="transparent")
@@ -574,49 +742,95 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
             command=self.refresh_history_ui
         ).pack(side="left")
         
+        # Filters (applied on Enter / ACTUALIZAR, always from the first page)
+        self.history_search = ctk.CTkEntry(ctrl_frame, placeholder_text="Buscar título...", width=180, fg_color=DOWNMESS_OBSIDIAN, border_color="#333", corner_radius=0)
+        self.history_search.pack(side="left", padx=(10, 5))
+        self.history_quality_var = ctk.StringVar(value="Todas")
+        self.history_quality_combo = ctk.CTkComboBox(ctrl_frame, values=["Todas"], variable=self.history_quality_var, width=150, corner_radius=0, command=lambda _: self.refresh_history_ui())
+        self.history_quality_combo.pack(side="left", padx=5)
+        self.history_domain = ctk.CTkEntry(ctrl_frame, placeholder_text="Dominio", width=110, fg_color=DOWNMESS_OBSIDIAN, border_color="#333", corner_radius=0)
+        self.history_domain.pack(side="left", padx=5)
+        self.history_from = ctk.CTkEntry(ctrl_frame, placeholder_text="Desde AAAA-MM-DD", width=120, fg_color=DOWNMESS_OBSIDIAN, border_color="#333", corner_radius=0)
+        self.history_from.pack(side="left", padx=5)
+        self.history_to = ctk.CTkEntry(ctrl_frame, placeholder_text="Hasta AAAA-MM-DD", width=120, fg_color=DOWNMESS_OBSIDIAN, border_color="#333", corner_radius=0)
+        self.history_to.pack(side="left", padx=5)
+        for entry in (self.history_search, self.history_domain, self.history_from, self.history_to):
+            entry.bind("<Return>", lambda e: self.refresh_history_ui())
+        
         ctk.CTkLabel(ctrl_frame, text="HISTORIAL DE DESCARGAS", font=DOWNMESS_FONT_SUB, text_color=DOWNMESS_CYAN).pack(side="right")
 
         # History List
-        self.history_scroll = ctk.CTkScrollableFrame(self.tab_history, fg_color="transparent")
-        self.history_scroll.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.history_list = VirtualList(self.tab_history, 70, self.create_history_row, self.bind_history_row, empty_text="No hay historial reciente.", fg_color="transparent")
+        self.history_list.grid(row=1, column=0, padx=20, pady=(0, 10), sticky="nsew")
+        
+        # Pagination
+        page_frame = ctk.CTkFrame(self.tab_history, fg_color="transparent")
+        page_frame.grid(row=2, column=0, padx=20, pady=(0, 20))
+        self.history_prev_btn = ctk.CTkButton(page_frame, text="<", width=40, fg_color="#222", command=lambda: self.refresh_history_ui(self.history_page - 1))
+        self.history_prev_btn.pack(side="left")
+        self.history_page_label = ctk.CTkLabel(page_frame, text="", font=("Consolas", 11), text_color="gray")
+        self.history_page_label.pack(side="left", padx=15)
+        self.history_next_btn = ctk.CTkButton(page_frame, text=">", width=40, fg_color="#222", command=lambda: self.refresh_history_ui(self.history_page + 1))
+        self.history_next_btn.pack(side="left")
         
         self.refresh_history_ui()
 
-    def refresh_history_ui(self):
-        # Clear existing
-        for w in self.history_scroll.winfo_children():
-            w.destroy()
-            
-        history_data = self.core.history
+    def refresh_history_ui(self, page=0):
+        quality = self.history_quality_var.get()
+        try:
+            self.history_quality_combo.configure(values=["Todas"] + self.core.history_qualities())
+            history_data, total = self.core.query_history(
+                page=max(0, page),
+                page_size=HISTORY_PAGE_SIZE,
+                quality=None if quality == "Todas" else quality,
+                date_from=self.history_from.get().strip() or None,
+                date_to=self.history_to.get().strip() or None,
+                domain=self.history_domain.get().strip() or None,
+                search=self.history_search.get().strip() or None
+            )
+        except Exception as e:
+            print(f"History error: {e}")
+            history_data, total = [], 0
         
-        if not history_data:
-            ctk.CTkLabel(self.history_scroll, text="No hay historial reciente.", text_color="gray").pack(pady=20)
-            return
+        pages = max(1, (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+        self.history_page = min(max(0, page), pages - 1)
+        self.history_page_label.configure(text=f"Página {self.history_page + 1}/{pages} ({total})")
+        self.history_prev_btn.configure(state="normal" if self.history_page > 0 else "disabled")
+        self.history_next_btn.configure(state="normal" if self.history_page < pages - 1 else "disabled")
+        
+        self.history_list.set_items(history_data)
+        
+    def create_history_row(self, parent):
+        card = ctk.CTkFrame(parent, fg_color=DOWNMESS_CARD, border_color="#333", border_width=1)
+        
+        # Info
+        info = ctk.CTkFrame(card, fg_color="transparent")
+        info.pack(side="left", padx=10, pady=10, fill="x", expand=True)
+        
+        card.title_label = ctk.CTkLabel(info, text="", font=("Consolas", 12, "bold"), text_color="white", anchor="w")
+        card.title_label.pack(fill="x")
+        card.meta_label = ctk.CTkLabel(info, text="", font=("Consolas", 10), text_color="gray", anchor="w")
+        card.meta_label.pack(fill="x")
+        
+        # Actions
+        btn_frame = ctk.CTkFrame(card, fg_color="transparent")
+        btn_frame.pack(side="right", padx=10)
+        
+        card.copy_btn = ctk.CTkButton(
+            btn_frame, 
+            text="COPIAR LINK", 
+            width=80, 
+            font=("Consolas", 10),
+            fg_color="#333", 
+            hover_color=DOWNMESS_CYAN
+        )
+        card.copy_btn.pack(side="right")
+        return card
 
-        for item in history_data:
-            card = ctk.CTkFrame(self.history_scroll, fg_color=DOWNMESS_CARD, border_color="#333", border_width=1)
-            card.pack(fill="x", pady=5)
-            
-            # Info
-            info = ctk.CTkFrame(card, fg_color="transparent")
-            info.pack(side="left", padx=10, pady=10, fill="x", expand=True)
-            
-            ctk.CTkLabel(info, text=item['title'], font=("Consolas", 12, "bold"), text_color="white", anchor="w").pack(fill="x")
-            ctk.CTkLabel(info, text=f"{item['date']} | {item['quality']}", font=("Consolas", 10), text_color="gray", anchor="w").pack(fill="x")
-            
-            # Actions
-            btn_frame = ctk.CTkFrame(card, fg_color="transparent")
-            btn_frame.pack(side="right", padx=10)
-            
-            ctk.CTkButton(
-                btn_frame, 
-                text="COPIAR LINK", 
-                width=80, 
-                font=("Consolas", 10),
-                fg_color="#333", 
-                hover_color=DOWNMESS_CYAN,
-                command=lambda u=item['url']: self.copy_to_clipboard(u)
-            ).pack(side="right")
+    def bind_history_row(self, card, item):
+        card.title_label.configure(text=item['title'])
+        card.meta_label.configure(text=f"{item['date']} | {item['quality']}")
+        card.copy_btn.configure(command=lambda u=item['url']: self.copy_to_clipboard(u))
             
     def copy_to_clipboard(self, text):
         self.clipboard_clear()
@@ -696,14 +910,16 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         ).pack(side="right")
 
         # Results Area
-        self.results_scroll = ctk.CTkScrollableFrame(
+        self.thumb_cache = {} # thumbnail URL -> CTkImage, shared by recycled result rows
+        self.results_list = VirtualList(
             self.tab_discovery,
-            fg_color="transparent",
+            90,
+            self.create_video_card,
+            self.bind_video_card,
             label_text="RESULTADOS ENCONTRADOS",
-            label_font=DOWNMESS_FONT_SUB,
-            label_text_color=DOWNMESS_GOLD
+            fg_color="transparent"
         )
-        self.results_scroll.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.results_list.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="nsew")
         
         self.populate_search_history()
 
@@ -766,31 +982,17 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         engine_code = engine_map.get(engine, "ytsearch")
 
         # Clear previous
-        for widget in self.results_scroll.winfo_children():
-            widget.destroy()
-            
-        loading = ctk.CTkLabel(self.results_scroll, text=f"Buscando en {engine}...", text_color="white")
-        loading.pack(pady=20)
+        self.results_list.set_items([], empty_text=f"Buscando en {engine}...")
         
-        threading.Thread(target=self.run_search, args=(query, engine_code, loading), daemon=True).start()
+        threading.Thread(target=self.run_search, args=(query, engine_code), daemon=True).start()
 
-    def run_search(self, query, engine, loading_label):
+    def run_search(self, query, engine):
         results = self.core.search_videos(query, limit=10, engine=engine)
-        loading_label.destroy()
-        
-        if not results:
-             ctk.CTkLabel(self.results_scroll, text="No se encontraron resultados.", text_color="gray").pack(pady=20)
-             return
-
-        for vid in results:
-            # We don't download thumbnails here to keep UI fast, 
-            # we'll use a thread/callback for each card.
-            self.create_video_card(vid)
+        self.after(0, lambda: self.results_list.set_items(results, empty_text="No se encontraron resultados."))
 
-    def create_video_card(self, vid_data):
-        # Geometric card
-        card = ctk.CTkFrame(self.results_scroll, fg_color=DOWNMESS_OBSIDIAN, border_color=DOWNMESS_STEEL, border_width=1, corner_radius=0)
-        card.pack(fill="x", pady=5, padx=5)
+    def create_video_card(self, parent):
+        # Geometric card (recycled: bind_video_card fills it for each result)
+        card = ctk.CTkFrame(parent, fg_color=DOWNMESS_OBSIDIAN, border_color=DOWNMESS_STEEL, border_width=1, corner_radius=0)
         
         # Micro-animation on hover
         card.bind("<Enter>", lambda e: card.configure(border_color=DOWNMESS_GOLD))
@@ -801,36 +1003,32 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         thumb_frame.pack(side="left", padx=10, pady=10)
         thumb_frame.pack_propagate(False)
         
-        thumb_label = ctk.CTkLabel(thumb_frame, text="...", text_color="gray")
-        thumb_label.pack(expand=True)
-        
-        # Fetch thumbnail in background
-        if vid_data.get('thumbnail'):
-            threading.Thread(target=self.load_thumbnail, args=(vid_data['thumbnail'], thumb_label), daemon=True).start()
+        card.thumb_label = ctk.CTkLabel(thumb_frame, text="...", text_color="gray")
+        card.thumb_label.pack(expand=True)
+        card.thumb_url = None
         
         info_frame = ctk.CTkFrame(card, fg_color="transparent")
         info_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         
-        title_lbl = ctk.CTkLabel(
+        card.title_label = ctk.CTkLabel(
             info_frame, 
-            text=vid_data['title'], 
+            text="", 
             font=("Roboto Bold", 14), 
             text_color="white", 
             anchor="w",
             wraplength=600
         )
-        title_lbl.pack(fill="x")
+        card.title_label.pack(fill="x")
         
-        meta_text = f"Duración: {self.format_seconds(vid_data['duration'])} | {vid_data['uploader']}"
-        meta_lbl = ctk.CTkLabel(info_frame, text=meta_text, font=("Roboto", 11), text_color="gray", anchor="w")
-        meta_lbl.pack(fill="x")
+        card.meta_label = ctk.CTkLabel(info_frame, text="", font=("Roboto", 11), text_color="gray", anchor="w")
+        card.meta_label.pack(fill="x")
 
         # Actions
         action_frame = ctk.CTkFrame(card, fg_color="transparent")
         action_frame.pack(side="right", padx=10)
 
         # "Preview" -> Open in Browser
-        preview_btn = ctk.CTkButton(
+        card.preview_btn = ctk.CTkButton(
             action_frame, 
             text="VER",
             width=50,
@@ -840,13 +1038,12 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
             border_color=DOWNMESS_STEEL,
             border_width=1,
             hover_color=DOWNMESS_STEEL,
-            corner_radius=0,
-            command=lambda u=vid_data['url']: webbrowser.open(u)
+            corner_radius=0
         )
-        preview_btn.pack(side="left", padx=5)
+        card.preview_btn.pack(side="left", padx=5)
 
         # "Download" -> Send to Tab
-        dl_btn = ctk.CTkButton(
+        card.dl_btn = ctk.CTkButton(
             action_frame, 
             text="SELECCIONAR",
             width=120,
@@ -855,10 +1052,26 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
             fg_color=DOWNMESS_GOLD,
             text_color="black",
             hover_color=DOWNMESS_ACCENT,
-            corner_radius=0,
-            command=lambda u=vid_data['url']: self.select_video_for_download(u)
+            corner_radius=0
         )
-        dl_btn.pack(side="left")
+        card.dl_btn.pack(side="left")
+        return card
+
+    def bind_video_card(self, card, vid_data):
+        card.title_label.configure(text=vid_data['title'])
+        card.meta_label.configure(text=f"Duración: {self.format_seconds(vid_data['duration'])} | {vid_data['uploader']}")
+        card.preview_btn.configure(command=lambda u=vid_data['url']: webbrowser.open(u))
+        card.dl_btn.configure(command=lambda u=vid_data['url']: self.select_video_for_download(u))
+        
+        # Thumbnail: cached image, or fetched in background for whichever result the card shows then
+        url = vid_data.get('thumbnail')
+        if url == card.thumb_url: return
+        card.thumb_url = url
+        if url in self.thumb_cache:
+            card.thumb_label.configure(image=self.thumb_cache[url], text="")
+        else:
+            card.thumb_label.configure(image=None, text="..." if url else "")
+            if url: threading.Thread(target=self.load_thumbnail, args=(url, card), daemon=True).start()
 
     def select_video_for_download(self, url):
         self.tab_view.set("DESCARGADOR")
@@ -891,30 +1104,41 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         normalize = self.normalize_var.get()
         s_time = self.start_entry.get().strip()
         e_time = self.end_entry.get().strip()
+        fragments = self.fragments_var.get()
+        fragments = "auto" if fragments == "Auto" else fragments
+        downloader = "aria2c" if self.aria2_var.get() else None
         
         # Stop animation
         self.progress_bar.stop()
         self.progress_bar.configure(mode="determinate")
 
         total = len(urls)
+        self.dl_jobs = {}
+        self.dl_total = total
+        self.progress_bar.set(0)
+        self.status_label.configure(text=f"Descargando 0/{total} (en paralelo)...")
         
         try:
-            for i, url in enumerate(urls):
-                self.progress_bar.set(0)
-                self.status_label.configure(text=f"Descargando {i+1}/{total}: {url}")
-                
-                # Delegate to Core
-                self.core.download_url(url, quality, normalize=normalize, 
-                                     progress_hook=self.progress_hook,
-                                     start_time=s_time if s_time else None,
-                                     end_time=e_time if e_time else None)
+            # Delegate to Core (parallel scheduler)
+            jobs = self.core.download_batch(urls, quality, normalize=normalize,
+                                            on_update=self.on_download_update,
+                                            start_time=s_time if s_time else None,
+                                            end_time=e_time if e_time else None,
+                                            fragment_concurrency=fragments,
+                                            external_downloader=downloader,
+                                            skip_duplicates=self.skip_dup_var.get())
+            failed = [j for j in jobs if j['status'] != 'done']
             
-            # Success State
             self.progress_bar.set(1.0)
-            self.progress_bar.configure(progress_color=DOWNMESS_CYAN)
-            self.status_label.configure(text="TODAS LAS TAREAS COMPLETADAS CON ÉXITO", text_color=DOWNMESS_CYAN)
-            
-            self.core.send_notification('Downmess', '¡Descarga por lotes finalizada con éxito!')
+            if failed:
+                self.progress_bar.configure(progress_color=DOWNMESS_RED)
+                self.status_label.configure(text=f"COMPLETADAS {total - len(failed)}/{total} | {len(failed)} CON ERROR", text_color=DOWNMESS_RED)
+                self.core.send_notification('Downmess', f'Lote finalizado: {len(failed)} descargas fallidas')
+            else:
+                # Success State
+                self.progress_bar.configure(progress_color=DOWNMESS_CYAN)
+                self.status_label.configure(text="TODAS LAS TAREAS COMPLETADAS CON ÉXITO", text_color=DOWNMESS_CYAN)
+                self.core.send_notification('Downmess', '¡Descarga por lotes finalizada con éxito!')
 
         except Exception as e:
             self.status_label.configure(text=f"Error: {e}", text_color=DOWNMESS_RED)
@@ -922,27 +1146,18 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
             self.download_btn.configure(state="normal")
             self.refresh_history_ui()
 
-    def progress_hook(self, d):
-        if d['status'] == 'downloading':
-            try:
-                # Calculate progress from bytes (more reliable than _percent_str)
-                total = d.get('total_bytes') or d.get('total_bytes_estimate')
-                downloaded = d.get('downloaded_bytes', 0)
-                
-                if total:
-                    p = downloaded / total
-                    self.progress_bar.set(p)
-                    
-                    # Update text with percentage for better feedback
-                    percent_text = f"{p*100:.1f}%"
-                    current_text = self.status_label.cget("text").split(":")[0] # Keep "Descargando X/Y"
-                    if "Descargando" in current_text:
-                        self.status_label.configure(text=f"{current_text}: {percent_text}")
-                else:
-                    # Fallback
-                    p = d.get('_percent_str', '0%').replace('%','')
-                    self.progress_bar.set(float(p)/100)
-            except: pass
+    def on_download_update(self, job):
+        """Called from scheduler threads whenever a download job changes."""
+        try:
+            self.dl_jobs[job['id']] = job
+            jobs = list(self.dl_jobs.values())
+            total = self.dl_total
+            finished = sum(1 for j in jobs if j['status'] in ('done', 'error', 'cancelled'))
+            running = sum(1 for j in jobs if j['status'] == 'running')
+            overall = sum(1.0 if j['status'] in ('done', 'error', 'cancelled') else j['progress'] for j in jobs) / total
+            self.progress_bar.set(overall)
+            self.status_label.configure(text=f"Descargando {finished}/{total} ({running} activas): {overall*100:.1f}%")
+        except: pass
 
     def reset_downloader_ui(self):
         """Resets the downloader tab validation and progress."""
@@ -954,18 +1169,19 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.status_label.configure(text="Esperando...", text_color="gray70")
         self.download_btn.configure(state="normal")
 
-    def load_thumbnail(self, url, label):
+    def load_thumbnail(self, url, card):
         try:
             with urllib.request.urlopen(url) as u:
                 raw_data = u.read()
             pil_img = Image.open(io.BytesIO(raw_data))
             # Resize for the card
             pil_img = pil_img.resize((120, 68), Image.Resampling.LANCZOS)
-            ctk_img = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=(120, 68))
-            label.configure(image=ctk_img, text="")
-            label.image = ctk_img # Keep ref
+            self.thumb_cache[url] = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=(120, 68))
         except:
-            label.configure(text="Error")
+            self.after(0, lambda: card.thumb_url == url and card.thumb_label.configure(text="Error"))
+            return
+        # The card may have been re-bound to another result while downloading
+        self.after(0, lambda: card.thumb_url == url and card.thumb_label.configure(image=self.thumb_cache[url], text=""))
 
     # --- History Logic ---    
     # Logic is now in setup_history_tab (above)
@@ -987,62 +1203,6 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
             self.url_textbox.insert("end", data + "\n")
             self.core.send_notification("Downmess", "Enlace añadido por arrastre")
 
-    def on_drop_files(self, event):
-        """Handle dropped files for conversion"""
-        data = event.data
-        if data:
-            # Handle multiple files (TkinterDnD returns space separated paths in curly braces if spaces exist)
-            # This is a basic parser, might need more robust splitting for complex paths
-            # For now, we assume standard behavior
-            import shlex
-            try:
-                # Normalize slashes
-                data = data.replace("\\", "/")
-                # If possibly multiple files
-                if "{" in data:
-                    # Regex split or simple replace logic
-                    # A robust way is to use regex to find {path with spaces} or path_without_spaces
-                    import re
-                    pattern = r'\{(?P<quoted>.*?)\}|(?P<plain>[^ ]+)'
-                    matches = re.finditer(pattern, data)
-                    files = []
-                    for m in matches:
-                        if m.group('quoted'): files.append(m.group('quoted'))
-                        elif m.group('plain'): files.append(m.group('plain'))
-                else:
-                    files = data.split()
-                
-                self.file_list.extend(files)
-                self.files_label.configure(text=f"{len(self.file_list)} archivos en cola (Añadidos por Drag & Drop)")
-                self.core.send_notification("Downmess", f"{len(files)} archivos añadidos")
-            except Exception as e:
-                print(f"DnD Error: {e}")
-
-    # --- Converter Logic (Concise) ---
-    def select_files(self):
-        files = filedialog.askopenfilenames()
-        if files:
-            self.file_list = files
-            self.files_label.configure(text=f"{len(files)} archivos en cola")
-
-    def start_conversion_thread(self):
-        threading.Thread(target=self.run_conversion, daemon=True).start()
-
-    def run_conversion(self):
-        fmt = self.format_var.get().lower()
-        normalize = self.norm_conv_var.get()
-        self.convert_btn.configure(state="disabled")
-        
-        for fp in self.file_list:
-            try:
-                self.core.convert_file(fp, fmt, normalize=normalize)
-            except: pass
-        
-        self.conv_status.configure(text="¡Conversión Terminada!", text_color=DOWNMESS_GREEN)
-        self.convert_btn.configure(state="normal")
-        self.file_list = []
-        self.core.send_notification('Downmess', '¡Conversión Completa!')
-
     # --- AI Tools Tab ---
     # --- AI Tools Tab ---
     def setup_tools_tab(self):
@@ -1068,6 +1228,19 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         )
         self.analyze_btn.pack(pady=10)
         
+        self.library_btn = ctk.CTkButton(
+            analyzer_frame, 
+            text="ESCANEAR BIBLIOTECA", 
+            font=DOWNMESS_FONT_SUB,
+            fg_color=DOWNMESS_STEEL, 
+            hover_color="#555",
+            corner_radius=0,
+            command=self.select_library_for_scan
+        )
+        self.library_btn.pack(pady=5)
+        self.library_label = ctk.CTkLabel(analyzer_frame, text="", font=("Consolas", 11), text_color="gray70")
+        self.library_label.pack()
+        
         # Details
         self.analysis_results_frame = ctk.CTkFrame(analyzer_frame, fg_color="transparent")
         self.analysis_results_frame.pack(fill="both", expand=True, padx=10)
@@ -1160,6 +1333,23 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
             command=self.start_resize_thread
         ).pack(pady=20)
         
+        # Folder mode: output format + interpolation for bulk thumbnails
+        folder_opts = ctk.CTkFrame(img_frame, fg_color="transparent")
+        folder_opts.pack(pady=5)
+        self.resize_fmt_var = ctk.StringVar(value="png")
+        ctk.CTkComboBox(folder_opts, values=["png", "jpg", "webp"], variable=self.resize_fmt_var, width=70, corner_radius=0).pack(side="left", padx=5)
+        self.resize_interp_var = ctk.StringVar(value="auto")
+        ctk.CTkComboBox(folder_opts, values=["auto", "area", "lanczos", "cubic", "linear"], variable=self.resize_interp_var, width=90, corner_radius=0).pack(side="left", padx=5)
+        
+        ctk.CTkButton(
+            img_frame, 
+            text="ESCALAR CARPETA", 
+            fg_color=DOWNMESS_STEEL, 
+            hover_color="#555", 
+            corner_radius=0,
+            command=self.start_resize_folder_thread
+        ).pack(pady=5)
+        
         # --- Section 3: AI Upscaling ---
         upscale_frame = ctk.CTkFrame(self.tab_tools, fg_color=DOWNMESS_OBSIDIAN, border_color=DOWNMESS_GOLD, border_width=1, corner_radius=0)
         upscale_frame.grid(row=0, column=2, padx=10, pady=20, sticky="nsew") # Moved to col 2
@@ -1235,6 +1425,29 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
         finally:
             self.after(0, lambda: self.analyze_btn.configure(state="normal", text="SELECCIONAR AUDIO"))
 
+    def select_library_for_scan(self):
+        initial = MUSIC_DIR if os.path.isdir(MUSIC_DIR) else os.getcwd()
+        folder = filedialog.askdirectory(initialdir=initial)
+        if folder:
+            self.library_btn.configure(state="disabled", text="ESCANEANDO...")
+            threading.Thread(target=self._library_scan_thread, args=(folder,), daemon=True).start()
+
+    def _library_scan_thread(self, folder):
+        def on_update(entry, done, total):
+            self.after(0, lambda: self.library_label.configure(text=f"{done}/{total}: {os.path.basename(entry['path'])}"))
+        try:
+            entries = self.core.scan_library(folder, on_update=on_update)
+            new = sum(1 for e in entries if e['status'] == 'analyzed')
+            failed = sum(1 for e in entries if e['status'] == 'error')
+            summary = f"{len(entries)} pistas ({new} nuevas, {failed} errores)"
+            self.after(0, lambda: self.library_label.configure(text=summary))
+            self.core.send_notification("Downmess", f"Biblioteca analizada: {summary}")
+        except Exception as e:
+            print(e)
+            self.core.send_notification("Error", str(e))
+        finally:
+            self.after(0, lambda: self.library_btn.configure(state="normal", text="ESCANEAR BIBLIOTECA"))
+
     def show_analysis_results(self, data):
         self.bpm_label.configure(text=f"BPM: {data['bpm']}")
         self.key_label.configure(text=f"KEY: {data['key']}")
@@ -1410,13 +1623,45 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
             h = int(self.resize_h.get())
             self.update_ai_status("Procesando...", False)
             
-            out = self.core.resize_image(f, w, h)
+            out = self.core.resize_image(f, w, h, interpolation=self.resize_interp_var.get(), fmt=self.resize_fmt_var.get())
             
             self.update_ai_status(out, True)
             self.core.send_notification("Downmess", "Rescalado completado")
         except Exception as e:
             self.update_ai_status(f"Error: {e}", False)
 
+    def start_resize_folder_thread(self):
+        folder = filedialog.askdirectory()
+        if not folder: return
+        threading.Thread(target=self.run_resize_folder, args=(folder,), daemon=True).start()
+
+    def run_resize_folder(self, folder):
+        try:
+            w = int(self.resize_w.get())
+            h = int(self.resize_h.get())
+            self.update_ai_status("Escalando carpeta...", False)
+            done = {}
+
+            def on_update(job):
+                if job['status'] in ('done', 'error'):
+                    done[job['id']] = job
+                    self.update_ai_status(f"Escalando carpeta... {len(done)}", False)
+
+            jobs = self.core.resize_folder(
+                folder, w, h,
+                interpolation=self.resize_interp_var.get(),
+                fmt=self.resize_fmt_var.get(),
+                on_update=on_update
+            )
+            failed = sum(1 for j in jobs if j['status'] == 'error')
+            if not jobs:
+                self.update_ai_status("No hay imágenes en la carpeta", False)
+                return
+            self.update_ai_status(folder if not failed else f"{len(jobs) - failed}/{len(jobs)} imágenes escaladas", not failed)
+            self.core.send_notification("Downmess", f"{len(jobs) - failed} imágenes escaladas")
+        except Exception as e:
+            self.update_ai_status(f"Error: {e}", False)
+
     def start_upscale_thread(self):
         threading.Thread(target=self.run_upscale, daemon=True).start()
         
@@ -1453,5 +1698,7 @@ class DownmessApp(ctk.CTk, TkinterDnD.DnDWrapper):
              self.update_ai_status(f"Error: {e}", False)
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support() # Library scan worker processes in the frozen build
     app = DownmessApp()
     app.mainloop()
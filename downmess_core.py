@@ -1,26 +1,647 @@
 import os
 import json
+import math
+import heapq
+import itertools
+import time
+import threading
+import zlib
+import struct
+import shutil
 import subprocess
 import yt_dlp
+from contextlib import contextmanager
+from collections import OrderedDict, deque
 from datetime import datetime
+from urllib.parse import urlparse
 # from plyer import notification (Moved to local scope)
 
 # Constants
-HISTORY_FILE = "downmess_history.json"
+HISTORY_FILE = "downmess_history.json" # Legacy format, migrated into HISTORY_DB_FILE
+HISTORY_DB_FILE = "downmess_history.db"
+HISTORY_PAGE_SIZE = 50
 SEARCH_HISTORY_FILE = "search_history.json"
+LOUDNESS_CACHE_FILE = "downmess_loudness.json"
+SEARCH_CACHE_FILE = "downmess_search_cache.json"
+SEARCH_CACHE_TTL = 6 * 3600 # Seconds a cached search result stays valid
+SEARCH_CACHE_MAX_ENTRIES = 200
+ANALYSIS_DB_FILE = "downmess_analysis.db"
+ANALYSIS_SR = 11025 # Sample rate analysis loads at; enough for onsets and chroma
+ANALYSIS_VERSION = 4 # Bump when analysis output changes so cached rows are recomputed
+WAVEFORM_PEAKS = 600 # Min/max pairs stored per analysed track
+WAVEFORM_SIZE = (600, 200) # Rendered waveform PNG (width, height)
+WAVEFORM_COLOR = "#00F3FF"
+MUSIC_DIR = "Musica"
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".flac", ".m4a", ".ogg", ".opus", ".aac"}
+LIBRARY_SCAN_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+LIBRARY_STREAM_BLOCK = 256 # STFT frames per streamed block in full-length analysis
+MAX_PARALLEL_DOWNLOADS = 4
+YDL_POOL_MAX_IDLE = 8 # Idle YoutubeDL instances kept across all option sets (least recently used go first)
+MAX_DOWNLOADS_PER_HOST = 2
+# Fragmented (DASH/HLS) downloads
+FRAGMENT_CONCURRENCY_DEFAULT = 4
+FRAGMENT_CONCURRENCY_MAX = 16
+FRAGMENT_CONCURRENCY_STEP = 2 # Largest change between two downloads from the same host
+FRAGMENT_THROUGHPUT_TOLERANCE = 0.1 # Relative throughput change treated as noise
+# EBU R128 target used for every normalization path
+LOUDNORM_I, LOUDNORM_TP, LOUDNORM_LRA = -16.0, -1.5, 11.0
+LOUDNORM_FILTER = f"loudnorm=I={LOUDNORM_I:g}:TP={LOUDNORM_TP:g}:LRA={LOUDNORM_LRA:g}"
+# Converter targets: encoder args per stream type (video None = audio-only target) and the
+# source codecs that can be stream-copied into the container (None = any codec)
+CONVERT_TARGETS = {
+    "mp3": {"video": None, "audio": ['-c:a', 'libmp3lame', '-q:a', '2'], "copy_audio": {"mp3"}},
+    "wav": {"video": None, "audio": ['-c:a', 'pcm_s16le'], "copy_audio": {"pcm_s16le"}},
+    "flac": {"video": None, "audio": ['-c:a', 'flac'], "copy_audio": {"flac"}},
+    "ogg": {"video": None, "audio": ['-c:a', 'libvorbis', '-q:a', '6'], "copy_audio": {"vorbis", "opus"}},
+    "m4a": {"video": None, "audio": ['-c:a', 'aac', '-b:a', '192k'], "copy_audio": {"aac", "alac"}},
+    "mp4": {"video": ['-c:v', 'libx264'], "audio": ['-c:a', 'aac'],
+            "copy_video": {"h264", "hevc", "av1", "mpeg4"}, "copy_audio": {"aac", "mp3", "ac3", "eac3", "opus", "alac"}},
+    "mov": {"video": ['-c:v', 'libx264'], "audio": ['-c:a', 'aac'],
+            "copy_video": {"h264", "hevc", "mpeg4", "prores", "mjpeg"}, "copy_audio": {"aac", "mp3", "alac", "pcm_s16le", "pcm_s24le"}},
+    "avi": {"video": ['-c:v', 'mpeg4'], "audio": ['-c:a', 'mp3'],
+            "copy_video": {"mpeg4", "mjpeg", "h264"}, "copy_audio": {"mp3", "ac3", "pcm_s16le"}},
+    "mkv": {"video": ['-c:v', 'libx264'], "audio": ['-c:a', 'aac', '-b:a', '192k'], "copy_video": None, "copy_audio": None},
+}
+# Converter speed/quality profiles: x264 preset + CRF, mpeg4 quantizer and GIF settings
+CONVERT_PROFILES = {
+    "Ultra Rápido": {"preset": "ultrafast", "crf": 28, "mpeg4_q": 6, "gif_fps": 8, "gif_width": 240, "gif_palette": False},
+    "Rápido": {"preset": "veryfast", "crf": 25, "mpeg4_q": 5, "gif_fps": 10, "gif_width": 320, "gif_palette": True},
+    "Equilibrado": {"preset": "medium", "crf": 23, "mpeg4_q": 4, "gif_fps": 10, "gif_width": 320, "gif_palette": True},
+    "Calidad": {"preset": "slow", "crf": 18, "mpeg4_q": 2, "gif_fps": 15, "gif_width": 480, "gif_palette": True},
+}
+DEFAULT_CONVERT_PROFILE = "Equilibrado"
+FFMPEG_STDERR_TAIL = 50 # Last ffmpeg stderr lines kept for error reports
+# AI models
+REMBG_DEFAULT_MODEL = "u2net"
+MODEL_IDLE_TIMEOUT = 300 # Seconds before an unused model session is released
+MODELS_DIR = "models"
+MODEL_MANIFEST_FILE = os.path.join(MODELS_DIR, "manifest.json")
+MODEL_MIRROR_ENV = "DOWNMESS_MODEL_MIRROR" # Local directory checked before downloading models
+MODEL_DOWNLOAD_RETRIES = 4
+SUPERRES_TILE_SIZE = 512
+SUPERRES_TILE_OVERLAP = 32 # Input pixels shared by neighbouring tiles (feather-blended)
+SUPERRES_WORKERS = max(1, min(4, os.cpu_count() or 1))
+SUPERRES_STRIP_ROWS = 128 # Input rows per strip in streaming mode
+SUPERRES_STREAMING_PIXELS = 32 * 1024 * 1024 # Output pixels above which upscaling streams by strips
+SUPERRES_CACHE_MAX_MODELS = 8 # One instance per tile worker, for a couple of (model, scale) pairs
+SUPERRES_CACHE_MAX_BYTES = 512 * 1024 * 1024 # Accounted by model file size
+# Image resizing: cv2 interpolation flags, and per output format the cv2 imwrite param + default value
+RESIZE_INTERPOLATIONS = {
+    "area": "INTER_AREA", "lanczos": "INTER_LANCZOS4", "cubic": "INTER_CUBIC",
+    "linear": "INTER_LINEAR", "nearest": "INTER_NEAREST",
+}
+RESIZE_FORMATS = {
+    "png": ("IMWRITE_PNG_COMPRESSION", 3),
+    "jpg": ("IMWRITE_JPEG_QUALITY", 90),
+    "webp": ("IMWRITE_WEBP_QUALITY", 90),
+}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tiff", ".tif"}
+EXTERNAL_DOWNLOADER_ARGS = {'aria2c': ['-x', '16', '-s', '16', '-k', '1M']}
+
+
+class JobScheduler:
+    """
+    Runs jobs on a bounded pool of worker threads.
+    Jobs are picked by priority (lower first, FIFO on ties) and at most
+    per_key_limit jobs sharing the same key (e.g. host) run at once.
+    Each job is a dict; on_update(job) is called whenever it changes.
+    """
+    def __init__(self, max_workers=MAX_PARALLEL_DOWNLOADS, per_key_limit=None, on_update=None):
+        self.max_workers = max(1, int(max_workers))
+        self.per_key_limit = per_key_limit
+        self.on_update = on_update
+        self.jobs = []
+        self._queue = []  # heap of (priority, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._active_keys = {}
+        self._workers = 0
+        self._pending = 0
+
+    def submit(self, func, key=None, priority=0, **info):
+        """Queues func(job) and returns the job dict."""
+        job = {
+            "id": len(self.jobs),
+            "key": key,
+            "priority": priority,
+            "status": "queued",
+            "progress": 0.0,
+            "result": None,
+            "error": None,
+            "func": func,
+            "cancel_event": threading.Event(),
+        }
+        job.update(info)
+        with self._cond:
+            self.jobs.append(job)
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            self._pending += 1
+            if self._workers < self.max_workers:
+                self._workers += 1
+                threading.Thread(target=self._worker, daemon=True).start()
+            self._cond.notify_all()
+        return job
+
+    def update(self, job, **changes):
+        job.update(changes)
+        if self.on_update:
+            try: self.on_update(job)
+            except Exception as e: print(f"Scheduler Callback Error: {e}")
+
+    def cancel(self, job):
+        """
+        Cancels a job. Queued jobs are dropped; running jobs get their
+        cancel_event set and their registered 'process' (if any) killed.
+        """
+        with self._cond:
+            status = job["status"]
+            if status == "queued":
+                job["status"] = "cancelled"
+            elif status == "running":
+                job["cancel_event"].set()
+                proc = job.get("process")
+                if proc:
+                    try: proc.kill()
+                    except Exception: pass
+            else:
+                return False
+        if status == "queued":
+            self.update(job)
+        return True
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            self.cancel(job)
+
+    def wait(self):
+        """Blocks until every submitted job has finished."""
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+        return self.jobs
+
+    def _next_job(self):
+        # Called with the lock held: first job by priority whose key has a free slot
+        skipped = []
+        job = None
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            candidate = item[2]
+            if candidate["status"] == "cancelled":
+                self._pending -= 1
+                self._cond.notify_all()
+                continue
+            key = candidate["key"]
+            if self.per_key_limit and key is not None and self._active_keys.get(key, 0) >= self.per_key_limit:
+                skipped.append(item)
+                continue
+            job = candidate
+            break
+        for item in skipped:
+            heapq.heappush(self._queue, item)
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if not self._queue:
+                        self._workers -= 1
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+                self._active_keys[job["key"]] = self._active_keys.get(job["key"], 0) + 1
+                job["status"] = "running"
+
+            self.update(job)
+            try:
+                result = job["func"](job)
+                self.update(job, status="done", progress=1.0, result=result)
+            except Exception as e:
+                status = "cancelled" if job["cancel_event"].is_set() else "error"
+                self.update(job, status=status, error=str(e))
+            finally:
+                with self._cond:
+                    self._active_keys[job["key"]] -= 1
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+
+class ModelCache:
+    """
+    Thread-safe cache of loaded models (inference sessions, networks).
+    Entries are created lazily by a loader on first use and released after
+    idle_timeout seconds without being requested. With max_items/max_bytes set,
+    the least recently used entries are evicted to stay within the limits
+    (sizes are what the caller reports for each entry).
+    """
+    def __init__(self, idle_timeout=MODEL_IDLE_TIMEOUT, max_items=None, max_bytes=None):
+        self.idle_timeout = idle_timeout
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict() # key -> [model, last_used, size], oldest first
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def get(self, key, loader, size=0):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [loader(), 0.0, size]
+                self.total_bytes += size
+                self._evict_over_limits()
+            self._entries.move_to_end(key)
+            entry[1] = time.monotonic()
+            self._schedule_sweep()
+            return entry[0]
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            self._timer = None
+            for key in [k for k, e in self._entries.items() if now - e[1] >= self.idle_timeout]:
+                self.total_bytes -= self._entries.pop(key)[2]
+            if self._entries:
+                self._schedule_sweep()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _evict_over_limits(self):
+        # Called with the lock held; the newest entry is always kept
+        while len(self._entries) > 1 and (
+                (self.max_items and len(self._entries) > self.max_items) or
+                (self.max_bytes and self.total_bytes > self.max_bytes)):
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry[2]
+
+    def _schedule_sweep(self):
+        # Called with the lock held
+        if self.idle_timeout and self._timer is None:
+            self._timer = threading.Timer(self.idle_timeout, self.evict_idle)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+class PngStripWriter:
+    """
+    Writes an 8-bit RGB PNG incrementally, a block of rows at a time, so large
+    images never have to be held in memory whole. Rows are given as BGR arrays
+    (OpenCV order) and stored with the PNG 'Sub' filter.
+    """
+    def __init__(self, path, width, height, level=6):
+        self.width, self.height = width, height
+        self.rows_written = 0
+        self._zlib = zlib.compressobj(level)
+        self._pending = []
+        self._pending_size = 0
+        self._file = open(path, 'wb')
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def write_rows(self, rows):
+        import numpy as np
+        rgb = np.ascontiguousarray(rows[:, :, ::-1]).reshape(rows.shape[0], -1)
+        filtered = np.empty((rgb.shape[0], rgb.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1 # Sub filter: each byte minus the same channel of the previous pixel
+        filtered[:, 1:4] = rgb[:, :3]
+        np.subtract(rgb[:, 3:], rgb[:, :-3], out=filtered[:, 4:], casting='unsafe')
+        self._queue(self._zlib.compress(filtered.tobytes()))
+        self.rows_written += rows.shape[0]
+
+    def close(self, complete=True):
+        if self._file.closed: return
+        try:
+            if complete:
+                if self.rows_written != self.height:
+                    raise Exception(f"PNG incompleto: {self.rows_written}/{self.height} filas")
+                self._queue(self._zlib.flush(), force=True)
+                self._chunk(b'IEND', b'')
+        finally:
+            self._file.close()
+
+    def _queue(self, data, force=False):
+        # Groups compressed output into ~1 MB IDAT chunks
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        if self._pending and (force or self._pending_size >= 1024 * 1024):
+            self._chunk(b'IDAT', b''.join(self._pending))
+            self._pending, self._pending_size = [], 0
+
+    def _chunk(self, tag, data):
+        self._file.write(struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+
+# Krumhansl-Kessler key profiles (C major / C minor), rotated for the other 11 tonics
+KEY_PROFILE_MAJOR = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
+KEY_PROFILE_MINOR = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+
+
+def _key_templates():
+    """24 x 12 matrix of z-scored key profiles (rows: C..B major, then C..B minor)."""
+    import numpy as np
+    rows = [np.roll(profile, tonic) for profile in (KEY_PROFILE_MAJOR, KEY_PROFILE_MINOR) for tonic in range(12)]
+    rows = np.array(rows, dtype=np.float64)
+    rows -= rows.mean(axis=1, keepdims=True)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def _key_from_chroma(chroma_vals):
+    """
+    Key (e.g. "A minor") from a 12-bin chroma energy vector: the major/minor profile,
+    over all tonics, with the highest Pearson correlation.
+    """
+    import numpy as np
+    chroma = np.asarray(chroma_vals, dtype=np.float64)
+    chroma = chroma - chroma.mean()
+    scores = _key_templates() @ (chroma / (np.linalg.norm(chroma) or 1.0))
+    best = int(np.argmax(scores))
+    return f"{NOTE_NAMES[best % 12]} {'major' if best < 12 else 'minor'}"
+
+
+def _resampled_blocks(path, sr, block_length, n_fft, hop_length):
+    """
+    Streams path resampled to sr, as blocks of block_length frames (center=False)
+    that overlap by n_fft - hop_length samples like librosa.stream blocks. The
+    resampler keeps its state between reads, so block boundaries add no artifacts.
+    """
+    import librosa
+    import numpy as np
+    import soxr
+
+    resampler = soxr.ResampleStream(librosa.get_samplerate(path), sr, 1, dtype='float32')
+    span = (block_length - 1) * hop_length + n_fft
+    advance = block_length * hop_length
+    pending = np.zeros(0, dtype=np.float32)
+    for chunk in librosa.stream(path, block_length=block_length, frame_length=hop_length, hop_length=hop_length,
+                                mono=True, dtype=np.float32):
+        pending = np.concatenate([pending, resampler.resample_chunk(chunk)])
+        while len(pending) >= span:
+            yield pending[:span]
+            pending = pending[advance:]
+    pending = np.concatenate([pending, resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)])
+    if len(pending) > n_fft - hop_length: # Samples not covered by any frame yet
+        yield np.pad(pending, (0, max(0, n_fft - len(pending))))
+
+
+def _analyze_track_full(path, block_length=LIBRARY_STREAM_BLOCK, n_fft=2048, hop_length=512):
+    """
+    Full-length BPM/key/peak analysis at ANALYSIS_SR, reading the file in blocks so
+    memory stays flat regardless of track length. Module-level so it can run in a
+    worker process. Returns {"bpm", "key", "peaks"} (peaks at hop resolution).
+    """
+    import librosa
+    import numpy as np
+
+    sr = ANALYSIS_SR
+    onsets, chroma_sum, lows, highs = [], np.zeros(12), [], []
+    try:
+        last_frame = None
+        for y in _resampled_blocks(path, sr, block_length, n_fft, hop_length):
+            # center=False keeps frame boundaries aligned across consecutive blocks; no top_db,
+            # since a floor relative to each block's own maximum would differ between blocks
+            mel = librosa.power_to_db(librosa.feature.melspectrogram(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length,
+                                                                     center=False), top_db=None)
+            if last_frame is None:
+                onsets.append(librosa.onset.onset_strength(S=mel, sr=sr, center=False))
+            else:
+                # The previous block's last frame makes the first flux value span the block boundary
+                onsets.append(librosa.onset.onset_strength(S=np.hstack([last_frame, mel]), sr=sr, center=False)[1:])
+            last_frame = mel[:, -1:]
+            chroma_sum += librosa.feature.chroma_stft(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length,
+                                                      center=False).sum(axis=1)
+            # Peaks only from the samples this block adds (the overlap belongs to the next one)
+            fresh = y[:block_length * hop_length]
+            frames = fresh[:len(fresh) - len(fresh) % hop_length].reshape(-1, hop_length)
+            lows.append(frames.min(axis=1))
+            highs.append(frames.max(axis=1))
+    except Exception:
+        # Containers libsndfile cannot stream (e.g. m4a) are decoded in one go instead
+        y, sr = librosa.load(path, sr=ANALYSIS_SR, mono=True)
+        onsets = [librosa.onset.onset_strength(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length)]
+        chroma_sum = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length).sum(axis=1)
+        frames = y[:len(y) - len(y) % hop_length].reshape(-1, hop_length)
+        lows, highs = [frames.min(axis=1)], [frames.max(axis=1)]
+
+    onset_env = np.concatenate(onsets)
+    tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length)
+    tempo = float(np.atleast_1d(tempo)[0])
+    return {
+        "bpm": round(tempo, 1),
+        "key": _key_from_chroma(chroma_sum),
+        "peaks": {"min": np.concatenate(lows), "max": np.concatenate(highs)}
+    }
+
 
 class DownmessCore:
-    def __init__(self):
-        self.history = self.load_history()
+    def __init__(self, model_mirror=None):
+        self.model_mirror = model_mirror or os.environ.get(MODEL_MIRROR_ENV)
+        self._model_lock = threading.Lock()
+        self._verified_models = set()
+        self._ydl_lock = threading.Lock()
+        self._ydl_pool = OrderedDict() # option-set key -> idle (YoutubeDL, hook target) pairs, LRU order
+        self._fragment_tuning = {} # host -> throughput hill-climbing state (see _tune_fragment_concurrency)
+        self._loudness_lock = threading.Lock()
+        self._hash_memo = {} # (path, size, mtime_ns) -> content hash
+        self._db_lock = threading.Lock()
+        self._db_ready = set() # SQLite files whose schema/migration already ran this session
+        self._history_fts = False # Set once the history DB is opened and FTS5 is available
+        self._extractors = None # yt-dlp extractor classes, loaded on the first duplicate check
+        self.loudness_cache = self.load_loudness_cache()
+        self._rembg_sessions = ModelCache()
+        self._superres_models = ModelCache(max_items=SUPERRES_CACHE_MAX_MODELS, max_bytes=SUPERRES_CACHE_MAX_BYTES)
         self.search_history = self.load_search_history()
+        self._search_lock = threading.Lock()
+        self.search_cache = self.load_search_cache()
+
+    # --- Storage ---
+    @contextmanager
+    def _sqlite(self, path, schema, setup=None):
+        """
+        Per-call SQLite connection in WAL mode, so threads never share a connection and
+        readers don't block the writer. schema (and setup(conn), e.g. a migration) run
+        once per file and session. Commits when the block exits cleanly.
+        """
+        import sqlite3
+        conn = sqlite3.connect(path, timeout=10)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL") # Durable enough under WAL, far fewer fsyncs
+            if path not in self._db_ready:
+                with self._db_lock:
+                    if path not in self._db_ready:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.executescript(schema)
+                        if setup: setup(conn)
+                        conn.commit()
+                        self._db_ready.add(path)
+            with conn: # Commits on success
+                yield conn
+        finally:
+            conn.close()
 
     # --- History Logic ---
-    def load_history(self):
-        if os.path.exists(HISTORY_FILE):
-            try:
-                with open(HISTORY_FILE, 'r') as f: return json.load(f)
-            except: return []
-        return []
+    def _history_db(self):
+        return self._sqlite(HISTORY_DB_FILE, """
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, url TEXT, quality TEXT, date TEXT);
+            CREATE TABLE IF NOT EXISTS downloads (
+                archive_id TEXT, quality TEXT, url TEXT, title TEXT, filepath TEXT, date TEXT,
+                PRIMARY KEY (archive_id, quality));
+            CREATE INDEX IF NOT EXISTS downloads_url ON downloads (url, quality);
+        """, setup=self._setup_history_db)
+
+    def _setup_history_db(self, conn):
+        """Schema upgrades, filter indexes, the FTS title index and the legacy JSON import."""
+        import sqlite3
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(history)")]
+        if "domain" not in columns:
+            conn.execute("ALTER TABLE history ADD COLUMN domain TEXT")
+            rows = conn.execute("SELECT id, url FROM history").fetchall()
+            conn.executemany("UPDATE history SET domain=? WHERE id=?", [(self._url_domain(u), i) for i, u in rows])
+        conn.executescript("""
+            CREATE INDEX IF NOT EXISTS history_date ON history (date);
+            CREATE INDEX IF NOT EXISTS history_quality ON history (quality, date);
+            CREATE INDEX IF NOT EXISTS history_domain ON history (domain, date);
+        """)
+
+        # Full-text title search; SQLite builds without FTS5 fall back to LIKE
+        try:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='history_fts'").fetchone()
+            conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(title, content='history', content_rowid='id');
+                CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+                    INSERT INTO history_fts (rowid, title) VALUES (new.id, new.title);
+                END;
+                CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+                    INSERT INTO history_fts (history_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                END;
+            """)
+            if not exists:
+                conn.execute("INSERT INTO history_fts (history_fts) VALUES ('rebuild')")
+            self._history_fts = True
+        except sqlite3.OperationalError:
+            self._history_fts = False
+
+        self._migrate_history_json(conn)
+
+    def _migrate_history_json(self, conn):
+        """Imports the legacy downmess_history.json (newest first) and renames it aside."""
+        if not os.path.exists(HISTORY_FILE): return
+        try:
+            with open(HISTORY_FILE, 'r') as f: entries = json.load(f)
+        except: entries = []
+        conn.executemany(
+            "INSERT INTO history (title, url, quality, date, domain) VALUES (?, ?, ?, ?, ?)",
+            [(e.get('title'), e.get('url'), e.get('quality'), e.get('date'), self._url_domain(e.get('url')))
+             for e in reversed(entries)]
+        )
+        conn.commit()
+        os.replace(HISTORY_FILE, HISTORY_FILE + ".migrated")
+
+    def _url_domain(self, url):
+        host = urlparse(url or "").netloc.lower().split('@')[-1].split(':')[0]
+        return host[4:] if host.startswith("www.") else host
+
+    def load_history(self, limit=None):
+        """History entries, newest first (optionally only the latest limit)."""
+        try:
+            with self._history_db() as db:
+                rows = db.execute("SELECT title, url, quality, date FROM history ORDER BY id DESC LIMIT ?",
+                                  (-1 if limit is None else limit,)).fetchall()
+        except Exception as e:
+            print(f"History error: {e}")
+            return []
+        return [{"title": t, "url": u, "quality": q, "date": d} for t, u, q, d in rows]
+
+    def query_history(self, page=0, page_size=HISTORY_PAGE_SIZE, quality=None, date_from=None, date_to=None,
+                      domain=None, search=None):
+        """
+        One page of history, newest first, plus the total number of matching entries.
+        date_from/date_to: "YYYY-MM-DD" (inclusive). domain also matches subdomains
+        ("youtube.com" covers "m.youtube.com"). search matches title words by prefix.
+        Returns (entries, total).
+        """
+        filters = [] # (SQL condition, parameters)
+        if quality:
+            filters.append(("quality = ?", [quality]))
+        if date_from:
+            filters.append(("date >= ?", [date_from]))
+        if date_to:
+            filters.append(("date <= ?", [date_to + (" 23:59:59" if len(date_to) == 10 else "")]))
+        if domain:
+            domain = self._url_domain("//" + domain.strip())
+            filters.append(("(domain = ? OR domain LIKE ?)", [domain, "%." + domain]))
+
+        with self._history_db() as db:
+            terms = (search or "").split()
+            if terms and self._history_fts:
+                match = " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+                filters.append(("id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)", [match]))
+            elif terms:
+                filters.extend(("title LIKE ?", [f"%{t}%"]) for t in terms)
+
+            clause = ("WHERE " + " AND ".join(sql for sql, _ in filters)) if filters else ""
+            args = [a for _, params in filters for a in params]
+            total = db.execute(f"SELECT COUNT(*) FROM history {clause}", args).fetchone()[0]
+            rows = db.execute(f"SELECT title, url, quality, date FROM history {clause} ORDER BY id DESC LIMIT ? OFFSET ?",
+                              args + [page_size, page * page_size]).fetchall()
+        return [{"title": t, "url": u, "quality": q, "date": d} for t, u, q, d in rows], total
+
+    def history_qualities(self):
+        """Distinct quality labels present in the history, for filter pickers."""
+        with self._history_db() as db:
+            return [row[0] for row in db.execute("SELECT DISTINCT quality FROM history WHERE quality IS NOT NULL ORDER BY quality")]
+
+    # --- Download Index (skip items already on disk) ---
+    def _offline_archive_id(self, url):
+        """
+        yt-dlp download-archive ID ("<extractor> <video id>") worked out from the URL
+        alone, the same way yt-dlp pre-checks its archive: no network request.
+        None when no specific extractor can tell the ID from the URL.
+        """
+        if self._extractors is None:
+            from yt_dlp.extractor import gen_extractor_classes
+            self._extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+        for ie in self._extractors:
+            if ie.suitable(url):
+                temp_id = ie.get_temp_id(url)
+                return f"{ie.ie_key().lower()} {temp_id}" if temp_id else None
+        return None
+
+    def find_download(self, url, quality):
+        """Earlier download of this item at this quality whose file still exists, or None."""
+        archive_id = self._offline_archive_id(url)
+        with self._history_db() as db:
+            row = db.execute("SELECT archive_id, title, filepath FROM downloads WHERE quality=? AND (archive_id=? OR url=?)",
+                             (quality, archive_id, url)).fetchone()
+        if not row: return None
+        if row[2] and os.path.exists(row[2]):
+            return {"title": row[1], "filepath": row[2]}
+        # The file was moved or deleted: forget it so the item is fetched again
+        with self._history_db() as db:
+            db.execute("DELETE FROM downloads WHERE archive_id=? AND quality=?", (row[0], quality))
+        return None
+
+    def _record_download(self, info, url, quality, filepath):
+        extractor = info.get('extractor_key') or info.get('ie_key') or urlparse(url).netloc
+        archive_id = f"{extractor.lower()} {info.get('id')}" if info.get('id') else url
+        with self._history_db() as db:
+            db.execute("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?)", (
+                archive_id, quality, url, info.get('title', 'Unknown'), os.path.abspath(filepath),
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            ))
+
+    @property
+    def history(self):
+        return self.load_history()
 
     def add_history(self, title, url, quality):
         entry = {
@@ -29,10 +650,13 @@ class DownmessCore:
             "quality": quality,
             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        self.history.insert(0, entry) # Prepend
+        # Single-row insert: constant cost however long the history is, safe for concurrent downloads
         try:
-            with open(HISTORY_FILE, 'w') as f: json.dump(self.history, f, indent=4)
-        except: pass
+            with self._history_db() as db:
+                db.execute("INSERT INTO history (title, url, quality, date, domain) VALUES (?, ?, ?, ?, ?)",
+                           (entry['title'], entry['url'], entry['quality'], entry['date'], self._url_domain(url)))
+        except Exception as e:
+            print(f"History error: {e}")
 
     def load_search_history(self):
         if os.path.exists(SEARCH_HISTORY_FILE):
@@ -63,20 +687,37 @@ class DownmessCore:
         except: pass
 
     # --- Download Logic ---
-    def download_url(self, url, quality, normalize=False, progress_hook=None, start_time=None, end_time=None):
+    def download_url(self, url, quality, normalize=False, progress_hook=None, start_time=None, end_time=None,
+                     fragment_concurrency="auto", external_downloader=None, skip_duplicates=False):
         """
         Downloads URL with specified quality.
         normalize: If True, applies EBU R128 audio normalization.
         start_time/end_time: Format "HH:MM:SS" or "MM:SS" or seconds.
+        fragment_concurrency: Parallel fragments for DASH/HLS, an int or "auto"
+            (tuned from the throughput measured on previous downloads from the host).
+        external_downloader: Optional external backend (e.g. "aria2c") if installed.
+        skip_duplicates: If True, items already downloaded at this quality (and still on
+            disk) are skipped before any network request; returns the stored title.
         """
+        # Duplicate check (clips are always fetched: each time range is a different file)
+        if skip_duplicates and not (start_time or end_time):
+            try:
+                previous = self.find_download(url, quality)
+            except Exception as e:
+                print(f"Download index error: {e}")
+                previous = None
+            if previous:
+                print(f"Already downloaded, skipping: {previous['filepath']}")
+                return previous['title']
+
         ydl_opts = {
             'outtmpl': '%(title)s.%(ext)s',
-            'progress_hooks': [progress_hook] if progress_hook else [],
             'quiet': True,
             'no_warnings': True,
             'http_headers': {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'},
             'force_overwrites': True
         }
+        host = urlparse(url).netloc.lower()
 
         # Time Range Support (Using yt-dlp download_sections)
         if start_time or end_time:
@@ -93,6 +734,18 @@ class DownmessCore:
             }]
             # Important for sections to work without downloading the whole file first (if server supports range)
             ydl_opts['concurrent_fragment_downloads'] = 1 
+        else:
+            ydl_opts['concurrent_fragment_downloads'] = self._pick_fragment_concurrency(host, fragment_concurrency)
+            progress_hook = self._fragment_throughput_hook(host, ydl_opts['concurrent_fragment_downloads'], progress_hook)
+
+        # External Downloader Backend
+        if external_downloader:
+            if shutil.which(external_downloader):
+                ydl_opts['external_downloader'] = {'default': external_downloader}
+                if external_downloader in EXTERNAL_DOWNLOADER_ARGS:
+                    ydl_opts['external_downloader_args'] = {external_downloader: EXTERNAL_DOWNLOADER_ARGS[external_downloader]}
+            else:
+                print(f"External downloader '{external_downloader}' not found, using native downloader")
 
         # Quality Configuration
         if quality == "Mejor Calidad (4K/8K)":
@@ -120,7 +773,18 @@ class DownmessCore:
 
         # Folder Organization
         is_audio = "Audio" in quality or "MP3" in quality or "WAV" in quality
-        folder_name = "Musica" if is_audio else "Videos"
+        folder_name = MUSIC_DIR if is_audio else "Videos"
+
+        # Single-pass Normalization: loudnorm runs inside the ffmpeg call yt-dlp already
+        # makes (audio extraction or A/V merge), so the track is only encoded once.
+        # The encoder is forced because yt-dlp stream-copies when the codec already matches.
+        if normalize:
+            if quality == "Solo Audio (MP3 320kbps)":
+                ydl_opts['postprocessor_args'] = {'extractaudio+ffmpeg_o': ['-c:a', 'libmp3lame', '-b:a', '320k', '-af', LOUDNORM_FILTER]}
+            elif quality == "Solo Audio (WAV)":
+                ydl_opts['postprocessor_args'] = {'extractaudio+ffmpeg_o': ['-c:a', 'pcm_s16le', '-af', LOUDNORM_FILTER]}
+            elif 'merge_output_format' in ydl_opts:
+                ydl_opts['postprocessor_args'] = {'merger+ffmpeg_o': ['-c:a', 'aac', '-b:a', '192k', '-af', LOUDNORM_FILTER]}
         
         if not os.path.exists(folder_name):
             os.makedirs(folder_name)
@@ -129,9 +793,19 @@ class DownmessCore:
 
         # Variables to store info for post-processing
         downloaded_info = None
-        
+
+        # yt-dlp skips ExtractAudio when the source already has the target codec, and time
+        # ranges are merged by the ffmpeg downloader instead of Merger: record what really ran
+        postprocessed = {}
+        def postprocessor_hook(d):
+            source = (d.get('info_dict') or {}).get('filepath')
+            if d.get('status') == 'started' and d.get('postprocessor') == 'ExtractAudio' and source:
+                postprocessed['ExtractAudio'] = self._file_signature(source)
+            elif d.get('status') == 'finished' and d.get('postprocessor') == 'Merger':
+                postprocessed['Merger'] = True
+
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self._ydl_context(ydl_opts, progress_hook, postprocessor_hook) as ydl:
                 downloaded_info = ydl.extract_info(url, download=True)
         except Exception as e:
             print(f"Download Error: {e}")
@@ -141,55 +815,186 @@ class DownmessCore:
             return None
 
         title = downloaded_info.get('title', 'Unknown')
+
+        # Final Validation: yt-dlp reports the real path after merge/extract postprocessors
+        final_path = self._resolve_output_path(downloaded_info)
+        if not final_path or not os.path.exists(final_path):
+            print(f"Validation Error: File not found at {final_path}")
+            # We return None to indicate failure to the UI
+            return None
         
-        # Post-Download Normalization (Manual FFmpeg to avoid yt-dlp errors)
-        # Moved OUTSIDE the with context to ensure file handles are released
-        if normalize:
+        # Post-Download Normalization fallback (Manual FFmpeg) for downloads that skipped
+        # the in-pipeline pass: a single progressive format that needed no merge, a time range,
+        # or audio already in the target codec (the source file is left untouched then).
+        # Runs after the extractor context is released so file handles are closed
+        if is_audio:
+            extracted = postprocessed.get('ExtractAudio')
+            normalized_inline = extracted is not None and extracted != self._file_signature(final_path)
+        else:
+            normalized_inline = postprocessed.get('Merger', False)
+        normalized_inline = normalized_inline and 'postprocessor_args' in ydl_opts
+        if normalize and not normalized_inline:
             try:
-                # Use a fresh yt-dlp instance or simple logic to guess filename if needed, 
-                # but better to capture it inside or use the dict. 
-                # Re-instantiating solely for prepare_filename is safer.
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    filepath = ydl.prepare_filename(downloaded_info)
-                
-                # Fix extension if merged
-                if quality in ["Mejor Calidad (4K/8K)", "1080p", "720p"] and not filepath.endswith(".mp4"):
-                    filepath = os.path.splitext(filepath)[0] + ".mp4"
-                elif quality == "Solo Audio (MP3 320kbps)" and not filepath.endswith(".mp3"):
-                        filepath = os.path.splitext(filepath)[0] + ".mp3"
-                elif quality == "Solo Audio (WAV)" and not filepath.endswith(".wav"):
-                        filepath = os.path.splitext(filepath)[0] + ".wav"
-
-                if os.path.exists(filepath):
-                    self.normalize_audio_manual(filepath)
+                self.normalize_audio_manual(final_path)
             except Exception as e:
                 print(f"Normalization Error: {e}")
 
-        # Final Validation: Check if file exists
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                final_path = ydl.prepare_filename(downloaded_info)
-            
-            # Helper to find actual file if extension changed
-            if not os.path.exists(final_path):
-                # Try common extensions if main path missing
-                base = os.path.splitext(final_path)[0]
-                for ext in ['.mp4', '.mp3', '.wav', '.mkv', '.webm']:
-                    if os.path.exists(base + ext):
-                        final_path = base + ext
-                        break
-            
-            if not os.path.exists(final_path):
-                 print(f"Validation Error: File not found at {final_path}")
-                 # We return None to indicate failure to the UI
-                 return None
-                 
-        except Exception: 
-            pass
-
         self.add_history(title, url, quality)
+        if not (start_time or end_time):
+            try:
+                self._record_download(downloaded_info, url, quality, final_path)
+            except Exception as e:
+                print(f"Download index error: {e}")
         return title
 
+    def _pick_fragment_concurrency(self, host, requested="auto"):
+        """Fragment concurrency for a download: explicit value, or adaptive from measured throughput."""
+        if requested != "auto":
+            try: return max(1, min(int(requested), FRAGMENT_CONCURRENCY_MAX))
+            except (TypeError, ValueError): pass
+        state = self._fragment_tuning.get(host)
+        return state['next'] if state else FRAGMENT_CONCURRENCY_DEFAULT
+
+    def _fragment_throughput_hook(self, host, concurrency, progress_hook=None):
+        """Wraps progress_hook to measure the throughput of fragmented downloads from host."""
+        seen = {'fragments': 0}
+        def hook(d):
+            if d.get('status') == 'downloading' and d.get('fragment_index'):
+                seen['fragments'] = max(seen['fragments'], d['fragment_index'])
+            elif d.get('status') == 'finished':
+                # yt-dlp only reports fragment indexes while downloading; 'finished' carries elapsed
+                size = d.get('downloaded_bytes') or d.get('total_bytes')
+                elapsed = d.get('elapsed')
+                if seen['fragments'] > 1 and size and elapsed:
+                    self._tune_fragment_concurrency(host, concurrency, size / elapsed)
+                seen['fragments'] = 0
+            if progress_hook:
+                progress_hook(d)
+        return hook
+
+    def _tune_fragment_concurrency(self, host, used, throughput):
+        """
+        Hill-climbs the host's fragment concurrency on measured bytes/s: keeps stepping
+        while downloads get faster, steps back to the better setting and holds when they
+        get slower, and holds on a plateau. Moves at most FRAGMENT_CONCURRENCY_STEP at a time.
+        """
+        tolerance = FRAGMENT_THROUGHPUT_TOLERANCE
+        with self._ydl_lock:
+            state = self._fragment_tuning.get(host)
+            if state is None:
+                direction = 1 # Probe upwards from the default
+            elif used == state['used']:
+                # Same setting again: refine the measurement; a clear drift restarts probing
+                previous = state['throughput']
+                throughput = 0.7 * previous + 0.3 * throughput
+                direction = state['direction']
+                if direction == 0 and abs(throughput / previous - 1) > 2 * tolerance:
+                    direction = 1 if throughput < previous else -1
+            else:
+                gain = throughput / state['throughput']
+                moved_up = used > state['used']
+                if gain < 1 - tolerance:
+                    # Worse than before: go back to the previous setting and stay there
+                    self._fragment_tuning[host] = dict(state, direction=0, next=state['used'])
+                    return
+                direction = (1 if moved_up else -1) if gain > 1 + tolerance else 0
+            step = direction * FRAGMENT_CONCURRENCY_STEP
+            self._fragment_tuning[host] = {
+                'used': used,
+                'throughput': throughput,
+                'direction': direction,
+                'next': max(1, min(used + step, FRAGMENT_CONCURRENCY_MAX))
+            }
+
+    def _resolve_output_path(self, info):
+        """Final file path of a download as recorded by yt-dlp (after postprocessing)."""
+        for d in reversed(info.get('requested_downloads') or []):
+            if d.get('filepath'):
+                return d['filepath']
+        return info.get('filepath') or info.get('_filename')
+
+    def _file_signature(self, path):
+        """(path, inode, mtime) of a file, to tell whether something rewrote it; None if missing."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), st.st_ino, st.st_mtime_ns)
+
+    @contextmanager
+    def _ydl_context(self, ydl_opts, progress_hook=None, postprocessor_hook=None):
+        """
+        Borrows a pooled YoutubeDL instance for this option set.
+        Extractors and cookie state are loaded once per option set and reused
+        across jobs; progress and postprocessor hooks are rebound per borrow. At most
+        YDL_POOL_MAX_IDLE instances stay pooled, least recently used evicted first.
+        """
+        opts = {k: v for k, v in ydl_opts.items() if k not in ('progress_hooks', 'postprocessor_hooks')}
+        key = json.dumps(opts, sort_keys=True, default=str)
+        with self._ydl_lock:
+            idle = self._ydl_pool.get(key)
+            entry = idle.pop() if idle else None
+            if idle is not None and not idle:
+                del self._ydl_pool[key]
+
+        if entry is None:
+            target = {'hook': None, 'pp_hook': None}
+            def dispatch(d):
+                if target['hook']: target['hook'](d)
+            def dispatch_pp(d):
+                if target['pp_hook']: target['pp_hook'](d)
+            opts['progress_hooks'] = [dispatch]
+            opts['postprocessor_hooks'] = [dispatch_pp]
+            entry = (yt_dlp.YoutubeDL(opts), target)
+
+        ydl, target = entry
+        target['hook'] = progress_hook
+        target['pp_hook'] = postprocessor_hook
+        try:
+            yield ydl
+        finally:
+            target['hook'] = target['pp_hook'] = None
+            evicted = []
+            with self._ydl_lock:
+                idle = self._ydl_pool.setdefault(key, [])
+                self._ydl_pool.move_to_end(key)
+                if len(idle) < MAX_PARALLEL_DOWNLOADS:
+                    idle.append(entry)
+                    entry = None
+                # One-off option sets (time ranges, fragment counts) must not pile up
+                while sum(len(v) for v in self._ydl_pool.values()) > YDL_POOL_MAX_IDLE:
+                    oldest_key, oldest = next(iter(self._ydl_pool.items()))
+                    evicted.append(oldest.pop(0))
+                    if not oldest: del self._ydl_pool[oldest_key]
+            if entry:
+                evicted.append(entry)
+            for old_ydl, _ in evicted:
+                old_ydl.close()
+
+    def download_batch(self, urls, quality, on_update=None, max_workers=MAX_PARALLEL_DOWNLOADS,
+                       per_host=MAX_DOWNLOADS_PER_HOST, **download_opts):
+        """
+        Downloads several URLs in parallel, at most per_host at a time per domain.
+        download_opts are passed to download_url (normalize, start_time, ...).
+        on_update(job) receives every job change; job['progress'] is 0..1 and
+        job['result'] holds the title (None on failure). Returns the job list.
+        """
+        scheduler = JobScheduler(max_workers=max_workers, per_key_limit=per_host, on_update=on_update)
+
+        def run(job):
+            def hook(d):
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                if d.get('status') == 'downloading' and total:
+                    scheduler.update(job, progress=min(d.get('downloaded_bytes', 0) / total, 1.0))
+            title = self.download_url(job['url'], quality, progress_hook=hook, **download_opts)
+            if not title:
+                raise Exception("Descarga fallida")
+            return title
+
+        for i, url in enumerate(urls):
+            scheduler.submit(run, key=urlparse(url).netloc.lower() or None, priority=i, url=url)
+        return scheduler.wait()
+
     def _parse_time_to_seconds(self, time_str):
         """Helper to convert HH:MM:SS or MM:SS to total seconds."""
         if not time_str: return 0
@@ -204,8 +1009,11 @@ class DownmessCore:
         except:
             return 0
 
-    def normalize_audio_manual(self, filepath):
-        """Applies EBU R128 normalization using ffmpeg manually."""
+    def normalize_audio_manual(self, filepath, progress_hook=None):
+        """
+        Applies EBU R128 normalization using ffmpeg manually.
+        progress_hook: Receives live ffmpeg progress dicts (see _run_ffmpeg).
+        """
         temp_file = f"{filepath}.tmp{os.path.splitext(filepath)[1]}"
         
         # Determine codecs based on file extension
@@ -220,9 +1028,10 @@ class DownmessCore:
         elif ext == '.wav':
              cmd.extend(['-vn', '-acodec', 'pcm_s16le'])
         
-        cmd.extend(['-filter:a', 'loudnorm=I=-16:TP=-1.5:LRA=11', temp_file])
+        cmd.extend(['-filter:a', self._normalization_filter(filepath), temp_file])
         
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        duration = self._probe_duration(filepath) if progress_hook else None
+        self._run_ffmpeg(cmd, progress_hook=progress_hook, duration=duration)
         
         # Replace original with normalized (Retry logic for Windows)
         if os.path.exists(temp_file):
@@ -237,11 +1046,131 @@ class DownmessCore:
                     print(f"Error replacing file: {e}")
                     break
 
+    # --- Loudness Logic (Two-pass) ---
+    def load_loudness_cache(self):
+        if os.path.exists(LOUDNESS_CACHE_FILE):
+            try:
+                with open(LOUDNESS_CACHE_FILE, 'r') as f: return json.load(f)
+            except: return {}
+        return {}
+
+    def _file_hash(self, filepath):
+        """
+        SHA-256 of the file contents, used as a cache key.
+        Memoized by (path, size, mtime), so unchanged files are only read once per session.
+        """
+        import hashlib
+        st = os.stat(filepath)
+        memo_key = (os.path.abspath(filepath), st.st_size, st.st_mtime_ns)
+        cached = self._hash_memo.get(memo_key)
+        if cached: return cached
+
+        h = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        self._hash_memo[memo_key] = h.hexdigest()
+        return self._hash_memo[memo_key]
+
+    def measure_loudness(self, filepath, job=None):
+        """
+        First loudnorm pass: integrated loudness, true peak, LRA and threshold.
+        Measurements are cached by content hash, so a source is only analysed once.
+        job: Scheduler job, so cancelling it also stops the measurement.
+        """
+        key = self._file_hash(filepath)
+        with self._loudness_lock:
+            cached = self.loudness_cache.get(key)
+        if cached:
+            return cached
+
+        # loudnorm prints its JSON summary last, at info level, well within the stderr tail
+        cmd = ['ffmpeg', '-hide_banner', '-i', filepath, '-vn',
+               '-af', f'{LOUDNORM_FILTER}:print_format=json', '-f', 'null', '-']
+        log = '\n'.join(self._run_ffmpeg(cmd, job=job, loglevel='info'))
+        stats = json.loads(log[log.rindex('{'):log.rindex('}') + 1])
+        measurement = {
+            "input_i": float(stats['input_i']),
+            "input_tp": float(stats['input_tp']),
+            "input_lra": float(stats['input_lra']),
+            "input_thresh": float(stats['input_thresh']),
+            "target_offset": float(stats['target_offset'])
+        }
+
+        with self._loudness_lock:
+            self.loudness_cache[key] = measurement
+            try:
+                with open(LOUDNESS_CACHE_FILE, 'w') as f: json.dump(self.loudness_cache, f)
+            except: pass
+        return measurement
+
+    def _normalization_filter(self, filepath, job=None):
+        """
+        Second-pass filter for filepath. A plain volume change when the true peak
+        leaves room for it, otherwise linear loudnorm fed with the measured values.
+        Falls back to single-pass dynamic loudnorm if the measurement fails.
+        """
+        try:
+            m = self.measure_loudness(filepath, job=job)
+        except Exception as e:
+            if job is not None and job['cancel_event'].is_set():
+                raise
+            print(f"Loudness Measurement Error: {e}")
+            return LOUDNORM_FILTER
+
+        if not all(math.isfinite(v) for v in m.values()):
+            return LOUDNORM_FILTER # Silence or unmeasurable input
+
+        gain = LOUDNORM_I - m['input_i']
+        if m['input_tp'] + gain <= LOUDNORM_TP:
+            return f"volume={gain:.2f}dB"
+        return (f"{LOUDNORM_FILTER}:measured_I={m['input_i']}:measured_TP={m['input_tp']}"
+                f":measured_LRA={m['input_lra']}:measured_thresh={m['input_thresh']}"
+                f":offset={m['target_offset']}:linear=true")
+
     # --- Search Logic ---
-    def search_videos(self, query, limit=10, engine="ytsearch"):
+    def load_search_cache(self):
+        """Search cache from disk (oldest first), without entries past SEARCH_CACHE_TTL."""
+        cache = OrderedDict()
+        if os.path.exists(SEARCH_CACHE_FILE):
+            try:
+                with open(SEARCH_CACHE_FILE, 'r') as f: entries = json.load(f)
+                now = time.time()
+                for key, entry in entries:
+                    if now - entry['time'] < SEARCH_CACHE_TTL: cache[key] = entry
+            except: return OrderedDict()
+        return cache
+
+    def _search_cache_key(self, query, limit, engine):
+        return json.dumps([engine, " ".join(query.lower().split()), int(limit)])
+
+    def search_videos(self, query, limit=10, engine="ytsearch", use_cache=True):
         """
         Searches using yt-dlp with specific engine (ytsearch, scsearch).
+        Results are cached by (engine, query, limit) in memory and in SEARCH_CACHE_FILE
+        for SEARCH_CACHE_TTL, keeping the SEARCH_CACHE_MAX_ENTRIES most recently used.
         """
+        key = self._search_cache_key(query, limit, engine)
+        if use_cache:
+            with self._search_lock:
+                entry = self.search_cache.get(key)
+                if entry and time.time() - entry['time'] < SEARCH_CACHE_TTL:
+                    self.search_cache.move_to_end(key)
+                    return [dict(r) for r in entry['results']]
+
+        results = self._search_videos_online(query, limit, engine)
+        if results: # Failed/empty searches are retried next time
+            with self._search_lock:
+                self.search_cache[key] = {"time": time.time(), "results": results}
+                self.search_cache.move_to_end(key)
+                while len(self.search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+                    self.search_cache.popitem(last=False)
+                try:
+                    with open(SEARCH_CACHE_FILE, 'w') as f: json.dump(list(self.search_cache.items()), f)
+                except: pass
+        return [dict(r) for r in results]
+
+    def _search_videos_online(self, query, limit, engine):
         ydl_opts = {
             'quiet': True,
             'ignoreerrors': True,
@@ -252,7 +1181,7 @@ class DownmessCore:
         
         results = []
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self._ydl_context(ydl_opts) as ydl:
                 # Use engine prefix explicitly to be safe
                 search_term = f"{engine}{limit}:{query}"
                 info = ydl.extract_info(search_term, download=False)
@@ -272,11 +1201,17 @@ class DownmessCore:
         return results
 
     # --- Converter Logic ---
-    def convert_file(self, file_path, target_format, normalize=False):
+    def convert_file(self, file_path, target_format, normalize=False, job=None, progress_hook=None,
+                     profile=DEFAULT_CONVERT_PROFILE, threads=0):
         """
         Converts file to target_format using ffmpeg directly.
         normalize: If True, applies EBU R128 audio normalization.
+        job: Scheduler job when run from convert_batch (enables cancellation).
+        progress_hook: Receives live ffmpeg progress dicts (see _run_ffmpeg).
+        profile: Key of CONVERT_PROFILES (speed vs quality of video/GIF encodes).
+        threads: ffmpeg encoder threads (0 = ffmpeg default).
         """
+        settings = CONVERT_PROFILES.get(profile, CONVERT_PROFILES[DEFAULT_CONVERT_PROFILE])
         base_name = os.path.splitext(file_path)[0]
         output_file = f"{base_name}_converted.{target_format}"
         
@@ -284,30 +1219,18 @@ class DownmessCore:
         
         # Mapping Extended
         tf = target_format.lower()
+        media = None
         
-        # Audio
-        if tf == "mp3":
-            cmd.extend(['-vn', '-acodec', 'libmp3lame', '-q:a', '2'])
-        elif tf == "wav":
-            cmd.extend(['-vn', '-acodec', 'pcm_s16le'])
-        elif tf == "flac":
-            cmd.extend(['-vn', '-acodec', 'flac'])
-        elif tf == "ogg":
-            cmd.extend(['-vn', '-acodec', 'libvorbis', '-q:a', '6'])
-        elif tf == "m4a":
-            cmd.extend(['-vn', '-acodec', 'aac', '-b:a', '192k'])
-            
-        # Video
-        elif tf == "mp4":
-            cmd.extend(['-c:v', 'libx264', '-c:a', 'aac', '-strict', 'experimental'])
-        elif tf == "avi":
-            cmd.extend(['-c:v', 'mpeg4', '-c:a', 'mp3'])
-        elif tf == "mkv":
-            cmd.extend(['-c:v', 'copy', '-c:a', 'copy'])
-        elif tf == "mov":
-            cmd.extend(['-c:v', 'libx264', '-c:a', 'aac'])
+        # Audio / Video: remux (-c copy) every stream the target already accepts
+        if tf in CONVERT_TARGETS:
+            media = self.probe_media(file_path)
+            cmd.extend(self._stream_codec_args(tf, media, normalize, settings))
         elif tf == "gif":
-            cmd.extend(['-vf', 'fps=10,scale=320:-1:flags=lanczos'])
+            gif_filter = f"fps={settings['gif_fps']},scale={settings['gif_width']}:-1:flags=lanczos"
+            if settings['gif_palette']:
+                # Palette from the clip itself (palettegen) applied in the same pass (paletteuse)
+                gif_filter += ",split[s0][s1];[s0]palettegen=stats_mode=diff[p];[s1][p]paletteuse=dither=bayer"
+            cmd.extend(['-vf', gif_filter])
             
         # Images
         elif tf in ["png", "jpg", "jpeg", "webp", "tiff", "bmp", "ico"]:
@@ -316,85 +1239,568 @@ class DownmessCore:
         
         # Normalization (Audio/Video only)
         if normalize and tf not in ["gif", "png", "jpg", "jpeg", "webp", "tiff", "bmp", "ico"]:
-             cmd.extend(['-filter:a', 'loudnorm=I=-16:TP=-1.5:LRA=11'])
+             cmd.extend(['-filter:a', self._normalization_filter(file_path, job=job)])
             
+        if threads:
+            cmd.extend(['-threads', str(threads)])
         cmd.append(output_file)
         
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            duration = None
+            if progress_hook:
+                duration = self._media_duration(media) if media else self._probe_duration(file_path)
+            self._run_ffmpeg(cmd, job=job, progress_hook=progress_hook, duration=duration)
+        except Exception:
+            # Don't leave half-written files behind (failed or cancelled)
+            if os.path.exists(output_file):
+                try: os.remove(output_file)
+                except OSError: pass
+            raise
         return output_file
 
+    def convert_batch(self, files, target_format, normalize=False, workers=None, on_update=None,
+                      profile=DEFAULT_CONVERT_PROFILE):
+        """
+        Converts files running up to `workers` ffmpeg processes at once (default: one per core).
+        The cores are split between the processes via -threads; profile applies to the whole batch.
+        Returns the JobScheduler immediately: wait() gives the job list (job['path'],
+        job['result'] = output file) and cancel(job) stops a single file.
+        """
+        cores = os.cpu_count() or 1
+        workers = workers or cores
+        threads = max(1, cores // min(workers, len(files) or 1))
+        scheduler = JobScheduler(max_workers=workers, on_update=on_update)
+
+        def run(job):
+            def hook(d):
+                if 'fraction' in d:
+                    scheduler.update(job, progress=d['fraction'])
+            return self.convert_file(job['path'], target_format, normalize=normalize, job=job, progress_hook=hook,
+                                     profile=profile, threads=threads)
+
+        for fp in files:
+            scheduler.submit(run, path=fp)
+        return scheduler
+
+    def _run_ffmpeg(self, cmd, job=None, progress_hook=None, duration=None, loglevel='error'):
+        """
+        Runs an ffmpeg command, streaming its -progress output.
+        progress_hook(d) gets yt-dlp style dicts: status ('converting'/'finished'),
+        time and duration in seconds, fraction (0..1, when duration is known),
+        speed (x realtime) and size (bytes written).
+        When called for a scheduler job the process is registered on it so
+        JobScheduler.cancel can kill it. Returns the last FFMPEG_STDERR_TAIL stderr
+        lines; on failure they are attached to the CalledProcessError (e.stderr).
+        """
+        cmd = [cmd[0], '-nostats', '-loglevel', loglevel, '-progress', 'pipe:1'] + cmd[1:]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True, encoding='utf-8', errors='replace')
+        if job is not None:
+            job['process'] = proc
+            if job['cancel_event'].is_set(): proc.kill()
+
+        # Drained on its own thread so a chatty stderr can never fill the pipe and stall ffmpeg
+        stderr_tail = deque(maxlen=FFMPEG_STDERR_TAIL)
+        stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(l.rstrip('\n') for l in proc.stderr), daemon=True)
+        stderr_reader.start()
+
+        block = {}
+        for line in proc.stdout:
+            key, _, value = line.strip().partition('=')
+            if key != 'progress':
+                block[key] = value
+                continue
+            if progress_hook:
+                progress_hook(self._ffmpeg_progress_event(block, value, duration))
+            block = {}
+        proc.wait()
+        stderr_reader.join()
+
+        if job is not None:
+            job['process'] = None
+            if job['cancel_event'].is_set():
+                raise Exception("Conversión cancelada")
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr='\n'.join(stderr_tail))
+        return list(stderr_tail)
+
+    def _ffmpeg_progress_event(self, block, state, duration=None):
+        """Turns one key=value block from ffmpeg -progress into a progress dict."""
+        try: seconds = int(block.get('out_time_us') or block.get('out_time_ms') or 0) / 1_000_000
+        except ValueError: seconds = 0.0
+        try: speed = float(block.get('speed', '').rstrip('x'))
+        except ValueError: speed = None
+        try: size = int(block.get('total_size', 0))
+        except ValueError: size = 0
+
+        event = {
+            'status': 'finished' if state == 'end' else 'converting',
+            'time': seconds,
+            'duration': duration,
+            'speed': speed,
+            'size': size
+        }
+        if duration:
+            event['fraction'] = 1.0 if state == 'end' else min(seconds / duration, 1.0)
+        return event
+
+    def probe_media(self, file_path):
+        """ffprobe stream/format info as a dict (None if ffprobe fails)."""
+        try:
+            out = subprocess.run(['ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', file_path],
+                                 check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 text=True, encoding='utf-8', errors='replace').stdout
+            return json.loads(out)
+        except Exception:
+            return None
+
+    def _media_duration(self, media):
+        try: return float(media['format']['duration'])
+        except (KeyError, TypeError, ValueError): return None
+
+    def _probe_duration(self, file_path):
+        """Media duration in seconds via ffprobe (None if unknown)."""
+        return self._media_duration(self.probe_media(file_path))
+
+    def _video_encoder_tuning(self, encoder_args, settings):
+        """Preset/quality args from a CONVERT_PROFILES entry for the chosen video encoder."""
+        if 'libx264' in encoder_args:
+            return ['-preset', settings['preset'], '-crf', str(settings['crf'])]
+        if 'mpeg4' in encoder_args:
+            return ['-q:v', str(settings['mpeg4_q'])]
+        return []
+
+    def _stream_codec_args(self, tf, media, normalize=False, settings=None):
+        """
+        ffmpeg codec args for an audio/video target: '-c:x copy' for streams whose
+        codec the container accepts as-is, the target encoder for the rest.
+        Audio is always encoded when normalizing (filters can't be stream-copied).
+        Without probe info everything is transcoded, as before.
+        """
+        target = CONVERT_TARGETS[tf]
+        streams = media.get('streams', []) if media else None
+
+        def codecs(kind):
+            return {st.get('codec_name') for st in streams
+                    if st.get('codec_type') == kind and not st.get('disposition', {}).get('attached_pic')}
+
+        def can_copy(kind):
+            allowed = target[f'copy_{kind}']
+            if allowed is None: return True
+            return streams is not None and codecs(kind) <= allowed
+
+        args = []
+        if target['video'] is None:
+            args.append('-vn')
+        elif streams is not None and not codecs('video'):
+            pass # Nothing to map (or cover art only): let ffmpeg decide
+        elif can_copy('video'):
+            args.extend(['-c:v', 'copy'])
+        else:
+            args.extend(target['video'])
+            args.extend(self._video_encoder_tuning(target['video'], settings or CONVERT_PROFILES[DEFAULT_CONVERT_PROFILE]))
+
+        if streams is not None and not codecs('audio'):
+            pass
+        elif not normalize and can_copy('audio'):
+            args.extend(['-c:a', 'copy'])
+        else:
+            args.extend(target['audio'])
+        return args
+
     # --- Image & AI Tools ---
-    def resize_image(self, file_path, width, height):
+    def resize_image(self, file_path, width, height, interpolation="auto", fmt="png", quality=None, output_dir=None):
+        """
+        Resizes one image to <name>_resized_<w>x<h>.<fmt>.
+        interpolation: "auto" (AREA when shrinking, LANCZOS4 otherwise) or a RESIZE_INTERPOLATIONS key.
+        quality: PNG compression level 0-9, or JPG/WEBP quality 0-100 (None = RESIZE_FORMATS default).
+        """
         import cv2
         img = cv2.imread(file_path)
         if img is None: raise Exception("No se pudo leer la imagen")
-        
-        resized = cv2.resize(img, (int(width), int(height)), interpolation=cv2.INTER_LANCZOS4)
-        
-        output_path = f"{os.path.splitext(file_path)[0]}_resized_{width}x{height}.png"
-        cv2.imwrite(output_path, resized)
+        return self._write_resized(file_path, img, width, height, interpolation, fmt, quality, output_dir)
+
+    def resize_folder(self, source, width, height, interpolation="auto", fmt="png", quality=None,
+                      output_dir=None, workers=None, prefetch=None, on_update=None):
+        """
+        Resizes every image in a folder (or matching a glob pattern such as "fotos/*.jpg").
+        Decoding runs ahead of the resize/encode workers on a separate pool, so disk
+        reads overlap with CPU work; at most prefetch decoded images wait in memory.
+        Returns the job list (job['path'], job['result'] = output path).
+        """
+        import cv2
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Skip earlier results so re-running on the same folder does not resize them again
+        files = [f for f in self._collect_images(source) if output_dir or "_resized_" not in os.path.basename(f)]
+        workers = workers or os.cpu_count() or 4
+        prefetch = max(1, prefetch or workers * 2)
+        decoder = ThreadPoolExecutor(max_workers=max(1, min(4, workers)))
+        decoded = {}
+        submitted = set() # Every index is decoded once, by whoever asks for it first
+        decoded_lock = threading.Lock()
+
+        def schedule_decode(index):
+            # Called with decoded_lock held
+            if index < len(files) and index not in submitted:
+                submitted.add(index)
+                decoded[index] = decoder.submit(cv2.imread, files[index])
+
+        def run(job):
+            with decoded_lock:
+                # A worker can get ahead of the read-ahead window (prefetch < workers): decode on demand
+                schedule_decode(job['index'])
+                # Keep the read-ahead window full before working on this image
+                schedule_decode(job['index'] + prefetch)
+                pending = decoded.pop(job['index'])
+            img = pending.result()
+            if img is None: raise Exception("No se pudo leer la imagen")
+            return self._write_resized(job['path'], img, width, height, interpolation, fmt, quality, output_dir)
+
+        with decoded_lock:
+            for i in range(min(prefetch, len(files))):
+                schedule_decode(i)
+        scheduler = JobScheduler(max_workers=workers, on_update=on_update)
+        for i, fp in enumerate(files):
+            scheduler.submit(run, path=fp, index=i)
+        try:
+            return scheduler.wait()
+        finally:
+            decoder.shutdown(wait=False)
+
+    def _collect_images(self, source):
+        import glob
+        if os.path.isdir(source):
+            paths = [os.path.join(source, name) for name in os.listdir(source)]
+        else:
+            paths = glob.glob(source, recursive=True)
+        return sorted(p for p in paths if os.path.isfile(p) and os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS)
+
+    def _write_resized(self, file_path, img, width, height, interpolation, fmt, quality, output_dir):
+        import cv2
+        if fmt not in RESIZE_FORMATS: raise Exception(f"Formato no soportado: {fmt}")
+        resized = self._resize_array(img, width, height, interpolation)
+
+        base = os.path.splitext(file_path)[0]
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            base = os.path.join(output_dir, os.path.basename(base))
+        output_path = f"{base}_resized_{width}x{height}.{fmt}"
+
+        param, default = RESIZE_FORMATS[fmt]
+        params = [getattr(cv2, param), int(default if quality is None else quality)]
+        if not cv2.imwrite(output_path, resized, params): raise Exception("No se pudo guardar la imagen")
         return output_path
 
-    def upscale_image_ai(self, file_path, model="edsr", scale=4):
+    def upscale_image_ai(self, file_path, model="edsr", scale=4, overlap=SUPERRES_TILE_OVERLAP, workers=None,
+                         streaming=None):
+        """
+        AI super-resolution of an image to <name>_AI_x<scale>.png.
+        streaming: Upscale row strips and write the PNG as they finish, so peak RAM
+            stays bounded regardless of image height. None = automatic for large outputs.
+        """
         import cv2
-        from cv2 import dnn_superres
-        import numpy as np
         
         # Validation
         valid_models = ["edsr", "espcn", "fsrcnn", "lapsrn"]
         if model not in valid_models: model = "edsr"
         
-        # Model Path Management
-        model_filename = f"{model.upper()}_x{scale}.pb"
-        model_path = os.path.join(os.getcwd(), "models", model_filename)
-        
-        if not os.path.exists(os.path.dirname(model_path)):
-            os.makedirs(os.path.dirname(model_path))
-            
-        if not os.path.exists(model_path):
-             self.download_model(model, scale, model_path)
-             
-        # Inference
-        sr = dnn_superres.DnnSuperResImpl_create()
-        sr.readModel(model_path)
-        sr.setModel(model, scale)
-        
         img = cv2.imread(file_path)
         if img is None: raise Exception("No se pudo leer la imagen")
         
-        h, w = img.shape[:2]
+        output_path = f"{os.path.splitext(file_path)[0]}_AI_x{scale}.png"
+        
+        if streaming is None:
+            streaming = self._upscale_streams(img, scale)
+        if streaming:
+            self._upscale_streaming(img, model, scale, output_path, overlap=overlap, workers=workers)
+            return output_path
         
+        upscaled = self._upscale_array(img, model, scale, overlap=overlap, workers=workers)
+        cv2.imwrite(output_path, upscaled)
+        return output_path
+
+    def _upscale_streams(self, img, scale):
+        """True when upscaling img would produce more than SUPERRES_STREAMING_PIXELS."""
+        return img.shape[0] * img.shape[1] * scale * scale > SUPERRES_STREAMING_PIXELS
+
+    # --- Image Pipeline (in-memory stages) ---
+    def run_image_pipeline(self, file_paths, stages, workers=None, on_update=None):
+        """
+        Runs every image through stages in order and writes one PNG per file.
+        Each image is decoded once and kept as an array between stages; files
+        are processed in parallel. stages is a list of (name, options):
+          ("resize", {"width": w, "height": h})
+          ("remove_bg", {"model": "u2net"})
+          ("upscale", {"model": "edsr", "scale": 4})
+        Output names chain the usual suffixes, e.g. photo_resized_960x540_nobg_AI_x2.png.
+        A final upscale past SUPERRES_STREAMING_PIXELS streams its strips straight to
+        the PNG; one that is followed by other stages or has alpha is rejected.
+        Returns the job list (job['path'], job['result'] = output path).
+        """
+        import cv2
+
+        handlers = {
+            "resize": lambda img, o: self._resize_array(img, o["width"], o["height"], o.get("interpolation", "auto")),
+            "remove_bg": lambda img, o: self._remove_background_array(img, o.get("model", REMBG_DEFAULT_MODEL)),
+            "upscale": lambda img, o: self._upscale_array(img, o.get("model", "edsr"), int(o.get("scale", 4)),
+                                                          workers=o.get("workers")),
+        }
+        suffixes = {
+            "resize": lambda o: f"_resized_{o['width']}x{o['height']}",
+            "remove_bg": lambda o: "_nobg",
+            "upscale": lambda o: f"_AI_x{o.get('scale', 4)}",
+        }
+        for name, _ in stages:
+            if name not in handlers: raise Exception(f"Etapa desconocida: {name}")
+
+        def run(job):
+            img = cv2.imread(job['path'])
+            if img is None: raise Exception("No se pudo leer la imagen")
+            output_path = os.path.splitext(job['path'])[0] + "".join(suffixes[n](o) for n, o in stages) + ".png"
+            for i, (name, options) in enumerate(stages):
+                if name == "upscale" and self._upscale_streams(img, int(options.get("scale", 4))):
+                    # Too large to hold in memory: only possible as the last stage, written by strips
+                    if i < len(stages) - 1 or img.shape[2] == 4:
+                        raise Exception("Imagen demasiado grande para escalar dentro del pipeline; escálala como último paso y sin transparencia")
+                    self._upscale_streaming(img, options.get("model", "edsr"), int(options.get("scale", 4)), output_path,
+                                            workers=options.get("workers"))
+                    return output_path
+                img = handlers[name](img, options)
+                scheduler.update(job, progress=(i + 1) / (len(stages) + 1), stage=name)
+            if not cv2.imwrite(output_path, img): raise Exception("No se pudo guardar la imagen")
+            return output_path
+
+        scheduler = JobScheduler(max_workers=workers or SUPERRES_WORKERS, on_update=on_update)
+        for fp in file_paths:
+            scheduler.submit(run, path=fp)
+        return scheduler.wait()
+
+    def _resize_array(self, img, width, height, interpolation="auto"):
+        import cv2
+        width, height = int(width), int(height)
+        if interpolation == "auto":
+            h, w = img.shape[:2]
+            interpolation = "area" if width <= w and height <= h else "lanczos"
+        if interpolation not in RESIZE_INTERPOLATIONS: raise Exception(f"Interpolación no soportada: {interpolation}")
+        return cv2.resize(img, (width, height), interpolation=getattr(cv2, RESIZE_INTERPOLATIONS[interpolation]))
+
+    def _remove_background_array(self, img, model=REMBG_DEFAULT_MODEL):
+        """BGR(A) array in, BGRA array out (background made transparent)."""
+        import cv2
+        from rembg import remove
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA if img.shape[2] == 4 else cv2.COLOR_BGR2RGB)
+        cutout = remove(rgb, session=self._rembg_session(model))
+        return cv2.cvtColor(cutout, cv2.COLOR_RGBA2BGRA)
+
+    def _upscale_array(self, img, model, scale, overlap=SUPERRES_TILE_OVERLAP, workers=None):
+        """AI upscale of a BGR(A) array; an alpha channel is resized with bicubic interpolation."""
+        import cv2
+        alpha = None
+        if img.ndim == 3 and img.shape[2] == 4:
+            img, alpha = img[:, :, :3], img[:, :, 3]
+
+        h, w = img.shape[:2]
         # Tiling Logic for Memory Optimization (if image > 1000px on any side)
-        TILE_SIZE = 512
         if w > 1000 or h > 1000:
-            new_h, new_w = h * scale, w * scale
-            output_img = np.zeros((new_h, new_w, 3), dtype=np.uint8)
-            
-            for y in range(0, h, TILE_SIZE):
-                for x in range(0, w, TILE_SIZE):
-                    # Crop
-                    h_slice = min(y+TILE_SIZE, h) - y
-                    w_slice = min(x+TILE_SIZE, w) - x
-                    roi = img[y:y+h_slice, x:x+w_slice]
-                    
-                    # Upscale
-                    upscaled_roi = sr.upsample(roi)
-                    
-                    # Place
-                    out_y, out_x = y * scale, x * scale
-                    out_h_slice, out_w_slice = upscaled_roi.shape[:2]
-                    output_img[out_y:out_y+out_h_slice, out_x:out_x+out_w_slice] = upscaled_roi
-                    
-            upscaled = output_img
+            upscaled = self._upscale_tiled(img, model, scale, overlap=overlap, workers=workers)
         else:
-            upscaled = sr.upsample(img)
+            sr, sr_lock = self._superres_model(model, scale)
+            with sr_lock:
+                upscaled = sr.upsample(img)
+
+        if alpha is not None:
+            alpha = cv2.resize(alpha, (upscaled.shape[1], upscaled.shape[0]), interpolation=cv2.INTER_CUBIC)
+            upscaled = cv2.merge(list(cv2.split(upscaled)) + [alpha])
+        return upscaled
+
+    def _upscale_streaming(self, img, model, scale, output_path, strip_rows=SUPERRES_STRIP_ROWS,
+                           overlap=SUPERRES_TILE_OVERLAP, workers=None):
+        """
+        Upscales img one strip of rows at a time and appends each strip to a PNG
+        written incrementally. Every strip is upscaled with `overlap` rows of
+        context above and below and then cropped, so strip borders don't show.
+        Peak memory depends on strip size and width, not on image height.
+        """
+        h, w = img.shape[:2]
+        writer = PngStripWriter(output_path, w * scale, h * scale)
+        try:
+            for y0 in range(0, h, strip_rows):
+                y1 = min(y0 + strip_rows, h)
+                top, bottom = min(overlap, y0), min(overlap, h - y1)
+                strip = self._upscale_tiled(img[y0 - top:y1 + bottom], model, scale, overlap=overlap, workers=workers)
+                writer.write_rows(strip[top * scale:(top + y1 - y0) * scale])
+                del strip
+            writer.close()
+        except Exception:
+            writer.close(complete=False)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+
+    def _upscale_tiled(self, img, model, scale, tile=SUPERRES_TILE_SIZE, overlap=SUPERRES_TILE_OVERLAP, workers=None):
+        """
+        Upscales img tile by tile on a thread pool (OpenCV DNN releases the GIL),
+        one network instance per worker. Tiles overlap by `overlap` input pixels and
+        are composited in grid order straight into the uint8 output: tile interiors
+        are copied, only the bands shared with earlier tiles are feather-blended.
+        """
+        import numpy as np
+
+        h, w = img.shape[:2]
+        overlap = max(0, min(int(overlap), tile // 2))
+        rows = self._tile_starts(h, tile, tile - overlap)
+        cols = self._tile_starts(w, tile, tile - overlap)
+        out = np.empty((h * scale, w * scale, 3), dtype=np.uint8)
+
+        def feather(length, at_start, at_end):
+            # Linear ramp over the overlap on edges shared with a neighbour tile
+            ramp = np.ones(length, dtype=np.float32)
+            n = min(overlap * scale, length)
+            if n:
+                edge = (np.arange(n, dtype=np.float32) + 0.5) / n
+                if not at_start: ramp[:n] = np.minimum(ramp[:n], edge)
+                if not at_end: ramp[-n:] = np.minimum(ramp[-n:], edge[::-1])
+            return ramp
+
+        def axis_weights(starts, length):
+            # Blend weights are separable, so each axis is normalized on its own. Per tile:
+            # (weight, summed weight of earlier tiles, summed weight up to and including it)
+            ramps = []
+            total = np.zeros(length * scale, dtype=np.float32)
+            for a in starts:
+                b = min(a + tile, length)
+                ramp = np.zeros(length * scale, dtype=np.float32)
+                ramp[a * scale:b * scale] = feather((b - a) * scale, a == 0, b == length)
+                ramps.append(ramp)
+                total += ramp
+            weights, before = [], np.zeros(length * scale, dtype=np.float32)
+            for a, ramp in zip(starts, ramps):
+                span = slice(a * scale, min(a + tile, length) * scale)
+                ramp /= total
+                weights.append((ramp[span], before[span].copy(), (before + ramp)[span]))
+                before += ramp
+            return weights
+
+        row_weights, col_weights = axis_weights(rows, h), axis_weights(cols, w)
+
+        def composite(r, c, up):
+            # Over-compositing with alpha = weight / (weight so far) yields the normalized blend
+            wy, before_y, _ = row_weights[r]
+            wx, before_x, upto_x = col_weights[c]
+            top, left = int(np.count_nonzero(before_y)), int(np.count_nonzero(before_x))
+            oy, ox = rows[r] * scale, cols[c] * scale
+            region = out[oy:oy + up.shape[0], ox:ox + up.shape[1]]
+            region[top:, left:] = up[top:, left:]
+            for ys, xs in ((slice(0, top), slice(None)), (slice(top, None), slice(0, left))):
+                if region[ys, xs].size == 0: continue
+                alpha = np.outer(wy[ys], wx[xs]) / (before_y[ys, None] + np.outer(wy[ys], upto_x[xs]))
+                band = region[ys, xs].astype(np.float32)
+                band += (up[ys, xs] - band) * alpha[..., None]
+                np.rint(band, out=band)
+                region[ys, xs] = np.clip(band, 0, 255)
+
+        # Tiles finish out of order; each is composited once every earlier tile has been
+        pending = {}
+        state = {'next': 0}
+        out_lock = threading.Lock()
+        slots = threading.local()
+        next_slot = itertools.count()
+
+        def run(job):
+            if not hasattr(slots, 'index'):
+                slots.index = next(next_slot)
+            sr, sr_lock = self._superres_model(model, scale, slot=slots.index)
+            r, c = job['grid']
+            y0, x0 = rows[r], cols[c]
+            with sr_lock:
+                up = sr.upsample(img[y0:y0 + tile, x0:x0 + tile])
+            with out_lock:
+                pending[r * len(cols) + c] = up
+                while state['next'] in pending:
+                    composite(*divmod(state['next'], len(cols)), pending.pop(state['next']))
+                    state['next'] += 1
+
+        workers = workers or SUPERRES_WORKERS
+        scheduler = JobScheduler(max_workers=workers)
+        for r in range(len(rows)):
+            for c in range(len(cols)):
+                scheduler.submit(run, grid=(r, c))
+        failed = [j for j in scheduler.wait() if j['status'] != 'done']
+        if failed:
+            raise Exception(f"Fallo en mosaico IA: {failed[0]['error']}")
+        return out
+
+    def _tile_starts(self, length, tile, step):
+        """Tile origins covering [0, length); the last tile is aligned to the end."""
+        starts = list(range(0, max(length - tile, 0) + 1, max(step, 1)))
+        if starts[-1] + tile < length:
+            starts.append(length - tile)
+        return starts
+
+    def _superres_model(self, model, scale, slot=0):
+        """
+        Cached (DnnSuperResImpl, lock) pair for (model, scale), downloading the
+        model file on first use. The cache is LRU-bounded by count and model size.
+        slot selects an independent instance, so parallel tile workers don't share one.
+        """
+        from cv2 import dnn_superres
+
+        model_path = self._ensure_model(model, scale)
+
+        def load():
+            sr = dnn_superres.DnnSuperResImpl_create()
+            sr.readModel(model_path)
+            sr.setModel(model, scale)
+            return sr, threading.Lock()
+
+        return self._superres_models.get((model, scale, slot), load, size=os.path.getsize(model_path))
+
+    def _ensure_model(self, model, scale):
+        """
+        Path of a verified local model file, downloading it if missing.
+        A file that fails its manifest checksum is discarded and fetched again.
+        """
+        # Model Path Management
+        model_filename = f"{model.upper()}_x{scale}.pb"
+        model_path = os.path.join(os.getcwd(), MODELS_DIR, model_filename)
         
-        output_path = f"{os.path.splitext(file_path)[0]}_AI_x{scale}.png"
-        cv2.imwrite(output_path, upscaled)
-        return output_path
+        with self._model_lock: # Tile workers may ask for the same model at once
+            if not os.path.exists(os.path.dirname(model_path)):
+                os.makedirs(os.path.dirname(model_path))
+
+            if os.path.exists(model_path) and model_path not in self._verified_models:
+                expected = self._load_model_manifest().get(model_filename)
+                if expected and self._file_hash(model_path) != expected:
+                    print(f"Model checksum mismatch, re-downloading: {model_filename}")
+                    os.remove(model_path)
+                else:
+                    self._verified_models.add(model_path)
+                
+            if not os.path.exists(model_path):
+                 self.download_model(model, scale, model_path)
+                 self._verified_models.add(model_path)
+        return model_path
+
+    def _load_model_manifest(self):
+        """models/manifest.json: model file name -> expected SHA-256."""
+        if os.path.exists(MODEL_MANIFEST_FILE):
+            try:
+                with open(MODEL_MANIFEST_FILE, 'r') as f: return json.load(f)
+            except: return {}
+        return {}
 
     def download_model(self, model, scale, path):
+        """
+        Fetches a model into path atomically: from the mirror directory if it has
+        the file, otherwise over HTTP into path + '.part' with Range resume.
+        The received size is checked against Content-Length/Content-Range, then the
+        result against the manifest SHA-256 (files without an entry get their hash
+        recorded) before being moved into place.
+        """
+        import http.client
         import urllib.request
+        import urllib.error
         # Using a reliable mirror for opencv models
         url_map = {
             "edsr": f"https://github.com/Saafke/EDSR_Tensorflow/raw/master/models/EDSR_x{scale}.pb",
@@ -407,68 +1813,286 @@ class DownmessCore:
         if not url:
              url = f"https://github.com/Saafke/EDSR_Tensorflow/raw/master/models/EDSR_x{scale}.pb"
 
-        print(f"Downloading AI Model: {url}...")
-        urllib.request.urlretrieve(url, path)
+        filename = os.path.basename(path)
+        part_path = path + ".part"
+        mirrored = os.path.join(self.model_mirror, filename) if self.model_mirror else None
+
+        if mirrored and os.path.exists(mirrored):
+            print(f"Copying AI Model from mirror: {mirrored}...")
+            shutil.copyfile(mirrored, part_path)
+        else:
+            print(f"Downloading AI Model: {url}...")
+            complete = False
+            for attempt in range(MODEL_DOWNLOAD_RETRIES):
+                offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                request = urllib.request.Request(url, headers={'Range': f'bytes={offset}-'} if offset else {})
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        # 206 = server honoured the Range, append; 200 = full body, start over
+                        if response.status == 206:
+                            mode, expected = 'ab', self._content_range_total(response.headers)
+                        else:
+                            length = response.headers.get('Content-Length')
+                            mode, expected = 'wb', int(length) if length and length.isdigit() else None
+                        with open(part_path, mode) as f:
+                            shutil.copyfileobj(response, f, 1024 * 1024)
+                    # A dropped connection can end the body early without raising
+                    received = os.path.getsize(part_path)
+                    complete = expected is None or received == expected
+                    if expected is not None and received > expected:
+                        os.remove(part_path) # Resumed onto a different file: start over
+                except urllib.error.HTTPError as e:
+                    if e.code != 416:
+                        if attempt == MODEL_DOWNLOAD_RETRIES - 1: raise
+                    else:
+                        # Nothing left to fetch: the .part is complete if it has the full size
+                        expected = self._content_range_total(e.headers)
+                        complete = expected is None or offset == expected
+                        if not complete: os.remove(part_path)
+                except (OSError, http.client.HTTPException): # IncompleteRead is not an OSError
+                    if attempt == MODEL_DOWNLOAD_RETRIES - 1: raise
+                if complete: break
+                time.sleep(2 ** attempt)
+            if not complete:
+                raise Exception(f"Descarga incompleta de {filename}")
+
+        digest = self._file_hash(part_path)
+        manifest = self._load_model_manifest()
+        expected = manifest.get(filename)
+        if expected and digest != expected:
+            os.remove(part_path)
+            raise Exception(f"Checksum inválido para {filename}")
+        if not expected:
+            manifest[filename] = digest
+            try:
+                with open(MODEL_MANIFEST_FILE, 'w') as f: json.dump(manifest, f, indent=4)
+            except: pass
+        os.replace(part_path, path)
+
+    def _content_range_total(self, headers):
+        """Full resource size from a Content-Range header ("bytes 0-99/1234"), None if absent or unknown."""
+        total = (headers.get('Content-Range') or '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
 
-    def remove_background(self, file_path):
+    def remove_background(self, file_path, model=REMBG_DEFAULT_MODEL):
         from rembg import remove
         from PIL import Image
         
         if not os.path.exists(file_path): raise Exception("Archivo no encontrado")
         
         input_img = Image.open(file_path)
-        output_img = remove(input_img)
+        output_img = remove(input_img, session=self._rembg_session(model))
         
         output_path = f"{os.path.splitext(file_path)[0]}_nobg.png"
         output_img.save(output_path)
         
         return output_path
 
+    def remove_background_batch(self, file_paths, model=REMBG_DEFAULT_MODEL, on_update=None):
+        """
+        Removes the background of many images through one shared model session.
+        Two workers overlap image decode/encode with inference. Returns the job list
+        (job['path'], job['result'] = output path).
+        """
+        self._rembg_session(model) # Load once before the workers start
+        scheduler = JobScheduler(max_workers=2, on_update=on_update)
+        for fp in file_paths:
+            scheduler.submit(lambda job: self.remove_background(job['path'], model=model), path=fp)
+        return scheduler.wait()
+
+    def _rembg_session(self, model=REMBG_DEFAULT_MODEL):
+        """Long-lived rembg/onnxruntime session for model, created on first use."""
+        from rembg import new_session
+        return self._rembg_sessions.get(model, lambda: new_session(model))
+
     # --- Audio Analysis (AI) ---
-    def analyze_audio(self, file_path):
-        import librosa
+    def _analysis_db(self):
+        """Short-lived SQLite connection to the analysis cache (safe to use from any thread)."""
+        return self._sqlite(ANALYSIS_DB_FILE, """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT);
+            CREATE TABLE IF NOT EXISTS analysis (
+                hash TEXT, params TEXT, bpm REAL, key TEXT, peaks TEXT, waveform BLOB, created TEXT,
+                PRIMARY KEY (hash, params));
+        """)
+
+    def _analysis_file_hash(self, file_path):
+        """Content hash of an audio file, persisted by (path, size, mtime) across sessions."""
+        path = os.path.abspath(file_path)
+        st = os.stat(path)
+        with self._analysis_db() as db:
+            row = db.execute("SELECT hash FROM files WHERE path=? AND size=? AND mtime_ns=?",
+                             (path, st.st_size, st.st_mtime_ns)).fetchone()
+        if row: return row[0]
+
+        digest = self._file_hash(path)
+        with self._analysis_db() as db:
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def _analysis_params(self, duration):
+        return json.dumps({"v": ANALYSIS_VERSION, "duration": duration, "peaks": WAVEFORM_PEAKS}, sort_keys=True)
+
+    def get_cached_analysis(self, file_path, duration=60):
+        """Cached analyze_audio() result for this file and parameters, or None."""
+        digest = self._analysis_file_hash(file_path)
+        with self._analysis_db() as db:
+            row = db.execute("SELECT bpm, key, peaks, waveform FROM analysis WHERE hash=? AND params=?",
+                             (digest, self._analysis_params(duration))).fetchone()
+        if not row: return None
+        return {"bpm": row[0], "key": row[1], "peaks": json.loads(row[2]), "waveform": row[3]}
+
+    def _store_analysis(self, file_path, duration, result):
+        digest = self._analysis_file_hash(file_path)
+        with self._analysis_db() as db:
+            db.execute("INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                digest, self._analysis_params(duration), result['bpm'], result['key'],
+                json.dumps(result['peaks']), result['waveform'], datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            ))
+
+    def waveform_peaks(self, y, width=WAVEFORM_PEAKS):
+        """
+        Per-pixel (min, max) envelope of a mono signal, as two lists of rounded floats.
+        Cheap enough for the UI to request at exactly the width it will draw.
+        """
         import numpy as np
-        import matplotlib.pyplot as plt
+        y = np.asarray(y, dtype=np.float32)
+        width = max(1, min(int(width), len(y)))
+        starts = np.linspace(0, len(y), width + 1).astype(np.int64)[:-1]
+        return {
+            "min": np.round(np.minimum.reduceat(y, starts).astype(np.float64), 4).tolist(),
+            "max": np.round(np.maximum.reduceat(y, starts).astype(np.float64), 4).tolist()
+        }
+
+    def _regroup_peaks(self, peaks, width):
+        """Merges (or repeats) min/max pairs so there is one per output column."""
+        import numpy as np
+        lo = np.asarray(peaks['min'], dtype=np.float32)
+        hi = np.asarray(peaks['max'], dtype=np.float32)
+        if len(lo) != width and len(lo):
+            starts = np.linspace(0, len(lo), width + 1).astype(np.int64)[:-1]
+            lo, hi = np.minimum.reduceat(lo, starts), np.maximum.reduceat(hi, starts)
+        return lo, hi
+
+    def render_waveform(self, peaks, width=WAVEFORM_SIZE[0], height=WAVEFORM_SIZE[1],
+                        color=WAVEFORM_COLOR, background="#000000"):
+        """
+        Rasterizes a min/max envelope to PNG bytes, one vertical span per pixel column.
+        peaks are regrouped when their count differs from width.
+        """
+        import numpy as np
+        from PIL import Image
         import io
+
+        lo, hi = self._regroup_peaks(peaks, width)
+
+        # Scale to the loudest peak (like an auto-scaled axis), amplitude 0 at mid-height
+        scale = float(max(np.abs(lo).max(initial=0), np.abs(hi).max(initial=0))) or 1.0
+        mid = (height - 1) / 2
+        top = np.rint(mid - hi / scale * mid)
+        bottom = np.rint(mid - lo / scale * mid)
+        rows = np.arange(height, dtype=np.float32)[:, None]
+        mask = (rows >= top[None, :]) & (rows <= bottom[None, :])
+
+        rgb = lambda c: np.array([int(c[i:i + 2], 16) for i in (1, 3, 5)], dtype=np.uint8)
+        pixels = np.where(mask[:, :, None], rgb(color), rgb(background)).astype(np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(pixels, 'RGB').save(buf, format='PNG', compress_level=1)
+        return buf.getvalue()
+
+    def analyze_audio(self, file_path, duration=60, use_cache=True):
+        """
+        BPM, key and waveform (PNG bytes + min/max peaks) of the first duration seconds.
+        Results are cached in ANALYSIS_DB_FILE by content hash and parameters.
+        """
+        if use_cache:
+            try:
+                cached = self.get_cached_analysis(file_path, duration)
+                if cached: return cached
+            except Exception as e:
+                print(f"Analysis cache error: {e}")
+
+        import librosa
+        import numpy as np
         
         try:
             # 1. Load Audio
-            y, sr = librosa.load(file_path, duration=60) # Analyze first 60s for speed
+            y, sr = librosa.load(file_path, sr=ANALYSIS_SR, duration=duration) # Analyze first 60s for speed
             
             # 2. BPM (Tempo)
             onset_env = librosa.onset.onset_strength(y=y, sr=sr)
             tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
             bpm = round(tempo, 1) if isinstance(tempo, float) else round(tempo[0], 1)
             
-            # 3. Key Detection (Simple Chroma)
-            chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-            chroma_vals = np.sum(chroma, axis=1)
-            notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-            key_idx = np.argmax(chroma_vals)
-            key = notes[key_idx]
+            # 3. Key Detection (STFT chroma vs. major/minor profiles)
+            chroma = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=2048, hop_length=512)
+            key = _key_from_chroma(np.sum(chroma, axis=1))
             
-            # 4. Waveform Image
-            plt.figure(figsize=(6, 2), facecolor='black')
-            librosa.display.waveshow(y, sr=sr, color='#00F3FF', alpha=0.8)
-            plt.axis('off')
-            plt.tight_layout(pad=0)
+            # 4. Waveform (peak envelope + PNG)
+            peaks = self.waveform_peaks(y)
             
-            # Save to bytes
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', facecolor='black')
-            buf.seek(0)
-            plt.close()
-            
-            return {
-                "bpm": bpm,
+            result = {
+                "bpm": float(bpm),
                 "key": key,
-                "waveform": buf.read() # Bytes of the PNG
+                "peaks": peaks,
+                "waveform": self.render_waveform(peaks) # Bytes of the PNG
             }
+            try:
+                self._store_analysis(file_path, duration, result)
+            except Exception as e:
+                print(f"Analysis cache error: {e}")
+            return result
             
         except Exception as e:
             print(f"Analysis Error: {e}")
             raise e
             
+    def scan_library(self, folder=MUSIC_DIR, workers=None, rescan=False, on_update=None):
+        """
+        Analyses every audio file under folder (full length, streamed) on a process pool.
+        Tracks whose content was already analysed are skipped unless rescan=True.
+        on_update(entry, done, total) is called as tracks finish; returns the entries
+        ({"path", "status": "cached"/"analyzed"/"error", "bpm", "key", "error"}).
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        import numpy as np
+
+        paths = []
+        for root, _, names in os.walk(folder):
+            paths.extend(os.path.join(root, n) for n in names if os.path.splitext(n)[1].lower() in AUDIO_EXTENSIONS)
+        paths.sort()
+
+        entries, pending = [], []
+        for path in paths:
+            cached = None if rescan else self.get_cached_analysis(path, duration=None)
+            if cached:
+                entries.append({"path": path, "status": "cached", "bpm": cached['bpm'], "key": cached['key']})
+            else:
+                pending.append(path)
+        total = len(paths)
+        if on_update:
+            for done, entry in enumerate(entries, 1): on_update(entry, done, total)
+        if not pending: return entries
+
+        with ProcessPoolExecutor(max_workers=workers or LIBRARY_SCAN_WORKERS) as pool:
+            futures = {pool.submit(_analyze_track_full, path): path for path in pending}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    result = future.result()
+                    lo, hi = self._regroup_peaks(result['peaks'], min(WAVEFORM_PEAKS, len(result['peaks']['min'])))
+                    peaks = {"min": np.round(lo.astype(np.float64), 4).tolist(),
+                             "max": np.round(hi.astype(np.float64), 4).tolist()}
+                    result = {"bpm": result['bpm'], "key": result['key'], "peaks": peaks,
+                              "waveform": self.render_waveform(peaks)}
+                    self._store_analysis(path, None, result)
+                    entry = {"path": path, "status": "analyzed", "bpm": result['bpm'], "key": result['key']}
+                except Exception as e:
+                    entry = {"path": path, "status": "error", "error": str(e)}
+                entries.append(entry)
+                if on_update: on_update(entry, len(entries), total)
+        return entries
+
     def send_notification(self, title, message):
         try:
             from plyer import notification
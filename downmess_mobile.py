@@ -1,6 +1,6 @@
 
 import flet as ft
-from downmess_core import DownmessCore
+from downmess_core import DownmessCore, HISTORY_PAGE_SIZE
 import threading
 import os
 import webbrowser
@@ -157,6 +157,7 @@ def main(page: ft.Page):
     
     normalize_switch = ft.Switch(label="Normalizar", value=True, active_color=MESS_GOLD, active_track_color=MESS_STEEL)
     auto_paste_switch = ft.Switch(label="Auto-Paste", value=False, active_color=MESS_GOLD, active_track_color=MESS_STEEL)
+    skip_dup_switch = ft.Switch(label="Omitir ya descargados", value=False, active_color=MESS_GOLD, active_track_color=MESS_STEEL)
 
     dl_progress = ft.ProgressBar(color=MESS_GOLD, bgcolor=MESS_STEEL, visible=False, border_radius=0)
     status_text = ft.Text(size=12, color=MESS_TEXT_DIM, font_family="Roboto")
@@ -173,14 +174,29 @@ def main(page: ft.Page):
         dl_progress.visible = True
         safe_update()
         
+        dl_progress.value = 0
+        jobs_state = {}
+
+        def on_update(job):
+            jobs_state[job['id']] = job
+            done = sum(1 for j in jobs_state.values() if j['status'] in ('done', 'error'))
+            dl_progress.value = sum(1.0 if j['status'] in ('done', 'error') else j['progress'] for j in jobs_state.values()) / len(urls)
+            status_text.value = f"Descargando {done}/{len(urls)}..."
+            safe_update()
+
         def _t():
             try:
-                for url in urls:
-                    core.download_url(url, quality_dropdown.value, 
-                                     normalize=normalize_switch.value,
-                                     start_time=start_time.value if start_time.value else None,
-                                     end_time=end_time.value if end_time.value else None)
-                status_text.value = "¡Todas las descargas completadas!"
+                jobs = core.download_batch(urls, quality_dropdown.value, 
+                                           normalize=normalize_switch.value,
+                                           on_update=on_update,
+                                           start_time=start_time.value if start_time.value else None,
+                                           end_time=end_time.value if end_time.value else None,
+                                           skip_duplicates=skip_dup_switch.value)
+                failed = sum(1 for j in jobs if j['status'] != 'done')
+                if failed:
+                    status_text.value = f"Completadas {len(jobs) - failed}/{len(jobs)} ({failed} con error)"
+                else:
+                    status_text.value = "¡Todas las descargas completadas!"
                 show_snack("Proceso Finalizado")
             except Exception as ex:
                 status_text.value = f"Error: {ex}"
@@ -196,6 +212,7 @@ def main(page: ft.Page):
             quality_dropdown,
             ft.Row([start_time, end_time], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
             ft.Row([normalize_switch, auto_paste_switch], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            skip_dup_switch,
             MessButton("EJECUTAR DESCARGAS", "download", on_click=run_dl, is_primary=True),
             dl_progress,
             status_text
@@ -312,10 +329,10 @@ def main(page: ft.Page):
 
     # --- 4. HISTORY ---
     history_col = ft.Column()
-    def refresh_history():
-        history_col.controls.clear()
+    history_state = {"page": 0}
+    def append_history_page():
         try:
-            h = core.load_history()
+            h, total = core.query_history(page=history_state["page"], page_size=HISTORY_PAGE_SIZE)
             for i in h:
                 history_col.controls.append(
                     ft.Container(
@@ -327,11 +344,24 @@ def main(page: ft.Page):
                         border=ft.border.only(bottom=ft.BorderSide(1, MESS_STEEL)),
                     )
                 )
+            history_more.visible = (history_state["page"] + 1) * HISTORY_PAGE_SIZE < total
         except: pass
+
+    def refresh_history():
+        history_col.controls.clear()
+        history_state["page"] = 0
+        append_history_page()
         safe_update()
 
+    def load_more_history(e):
+        history_state["page"] += 1
+        append_history_page()
+        safe_update()
+
+    history_more = MessButton("CARGAR MÁS", on_click=load_more_history)
+
     history_view = [
-        create_card("Historial", [history_col], "history")
+        create_card("Historial", [history_col, history_more], "history")
     ]
 
     # --- NAVIGATION ---
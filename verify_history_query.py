@@ -0,0 +1,84 @@
+import os
+import tempfile
+from downmess_core import DownmessCore
+
+ENTRIES = [
+    ("Rick Astley - Never Gonna Give You Up", "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "1080p", "2024-01-05 10:00:00"),
+    ("Lofi Beats to Study", "https://m.youtube.com/watch?v=jfKfPfyJRdk", "Solo Audio (MP3 320kbps)", "2024-02-10 12:30:00"),
+    ("Never Enough (Live)", "https://vimeo.com/123456", "720p", "2024-02-29 23:59:00"),
+    ("Podcast Episode 12", "https://soundcloud.com/show/ep12", "Solo Audio (MP3 320kbps)", "2024-03-01 08:00:00"),
+    ("Notyoutube Clip", "https://notyoutube.com/clip", "720p", "2024-03-02 09:00:00"),
+]
+
+def check(name, ok, detail=""):
+    print(f"[{'PASS' if ok else 'FAIL'}] {name}" + (f": {detail}" if detail and not ok else ""))
+    return ok
+
+def titles(result):
+    return [e['title'] for e in result[0]]
+
+def seed(core):
+    with core._history_db() as db:
+        db.executemany("INSERT INTO history (title, url, quality, date, domain) VALUES (?, ?, ?, ?, ?)",
+                       [(t, u, q, d, core._url_domain(u)) for t, u, q, d in ENTRIES])
+
+def test_filters(core):
+    print("Testing filters...")
+    result = core.query_history()
+    check("No filters returns everything, newest first", result[1] == 5 and titles(result)[0] == "Notyoutube Clip", result)
+
+    result = core.query_history(quality="Solo Audio (MP3 320kbps)")
+    check("Quality filter", titles(result) == ["Podcast Episode 12", "Lofi Beats to Study"], titles(result))
+
+    result = core.query_history(date_from="2024-02-01", date_to="2024-02-29")
+    check("Date range includes the whole last day", titles(result) == ["Never Enough (Live)", "Lofi Beats to Study"], titles(result))
+
+    result = core.query_history(domain="youtube.com")
+    check("Domain matches subdomains but not lookalikes",
+          titles(result) == ["Lofi Beats to Study", "Rick Astley - Never Gonna Give You Up"], titles(result))
+    check("Domain input is normalized", core.query_history(domain="www.YouTube.com")[1] == 2)
+
+    result = core.query_history(quality="720p", domain="vimeo.com")
+    check("Filters combine", titles(result) == ["Never Enough (Live)"], titles(result))
+
+def test_pagination(core):
+    print("\nTesting pagination...")
+    first, total = core.query_history(page=0, page_size=2)
+    second, _ = core.query_history(page=1, page_size=2)
+    last, _ = core.query_history(page=2, page_size=2)
+    check("Total independent of page", total == 5, total)
+    check("Pages do not overlap", len({e['title'] for e in first + second + last}) == 5)
+    check("Last page is partial", len(last) == 1, len(last))
+
+def test_search(core, label):
+    print(f"\nTesting title search ({label})...")
+    check(f"Word search ({label})", titles(core.query_history(search="never")) ==
+          ["Never Enough (Live)", "Rick Astley - Never Gonna Give You Up"])
+    check(f"Several words must all match ({label})",
+          titles(core.query_history(search="never gonna")) == ["Rick Astley - Never Gonna Give You Up"])
+    check(f"Word prefix ({label})", titles(core.query_history(search="pod")) == ["Podcast Episode 12"])
+    check(f"Search combines with filters ({label})", core.query_history(search="never", quality="720p")[1] == 1)
+    # FTS drops punctuation from terms; LIKE looks for the quote literally, it just must not break
+    quoted = core.query_history(search='"never')[1]
+    check(f"Quotes in the query are harmless ({label})", quoted == 2 if core._history_fts else quoted == 0, quoted)
+
+def main():
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder) # History files are relative to the working directory
+        try:
+            core = DownmessCore()
+            seed(core)
+            test_filters(core)
+            test_pagination(core)
+            if core._history_fts:
+                test_search(core, "FTS5")
+            else:
+                print("\n[SKIP] This SQLite build has no FTS5")
+            core._history_fts = False # Same queries through the LIKE fallback
+            test_search(core, "LIKE")
+        finally:
+            os.chdir(previous)
+
+if __name__ == "__main__":
+    main()
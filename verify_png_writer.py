@@ -0,0 +1,67 @@
+import os
+import tempfile
+import cv2
+import numpy as np
+from PIL import Image
+from downmess_core import PngStripWriter
+
+def check(name, ok, detail=""):
+    print(f"[{'PASS' if ok else 'FAIL'}] {name}" + (f": {detail}" if detail and not ok else ""))
+    return ok
+
+def write_strips(path, img, strip_rows):
+    writer = PngStripWriter(path, img.shape[1], img.shape[0])
+    for y in range(0, img.shape[0], strip_rows):
+        writer.write_rows(img[y:y + strip_rows])
+    writer.close()
+
+def test_round_trip(folder):
+    print("Testing strip round trip...")
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (301, 257, 3), dtype=np.uint8)
+    for strip_rows in (1, 64, 301):
+        path = os.path.join(folder, f"strips_{strip_rows}.png")
+        write_strips(path, img, strip_rows)
+        decoded = cv2.imread(path)
+        check(f"OpenCV reads back identical pixels ({strip_rows} rows per strip)",
+              decoded is not None and np.array_equal(decoded, img))
+        with Image.open(path) as im:
+            rgb = np.asarray(im.convert("RGB"))
+        check(f"PIL reads back identical pixels ({strip_rows} rows per strip)",
+              np.array_equal(rgb[:, :, ::-1], img), im.size)
+
+def test_large_image(folder):
+    print("\nTesting multi-chunk output...")
+    # Noise barely compresses, so this spans several ~1 MB IDAT chunks
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 256, (1024, 1024, 3), dtype=np.uint8)
+    path = os.path.join(folder, "large.png")
+    write_strips(path, img, 128)
+    with open(path, "rb") as f:
+        chunks = f.read().count(b"IDAT")
+    check("Output split into several IDAT chunks", chunks > 1, chunks)
+    check("Large image round trip", np.array_equal(cv2.imread(path), img))
+
+def test_incomplete(folder):
+    print("\nTesting incomplete images...")
+    path = os.path.join(folder, "short.png")
+    writer = PngStripWriter(path, 16, 16)
+    writer.write_rows(np.zeros((8, 16, 3), dtype=np.uint8))
+    try:
+        writer.close()
+        check("close() rejects missing rows", False, "no exception")
+    except Exception as e:
+        check("close() rejects missing rows", "8/16" in str(e), e)
+
+    writer = PngStripWriter(path, 16, 16)
+    writer.close(complete=False)
+    check("close(complete=False) only closes the file", writer._file.closed)
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        test_round_trip(folder)
+        test_large_image(folder)
+        test_incomplete(folder)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import threading
+import time
+from downmess_core import JobScheduler
+
+def check(name, ok, detail=""):
+    print(f"[{'PASS' if ok else 'FAIL'}] {name}" + (f": {detail}" if detail and not ok else ""))
+    return ok
+
+def wait_for_cancel(job):
+    # Like a killed ffmpeg process: a cancelled job ends by raising
+    if job['cancel_event'].wait(5):
+        raise Exception("cancelled")
+    return "timeout"
+
+def test_per_key_limit():
+    print("Testing per-key limit...")
+    lock = threading.Lock()
+    running = {}
+    peak = {}
+
+    def work(job):
+        with lock:
+            running[job['key']] = running.get(job['key'], 0) + 1
+            peak[job['key']] = max(peak.get(job['key'], 0), running[job['key']])
+        time.sleep(0.05)
+        with lock:
+            running[job['key']] -= 1
+        return job['key']
+
+    scheduler = JobScheduler(max_workers=6, per_key_limit=2)
+    for i in range(12):
+        scheduler.submit(work, key="a.com" if i % 2 else "b.com")
+    jobs = scheduler.wait()
+    check("All jobs done", all(j['status'] == 'done' for j in jobs), [j['status'] for j in jobs])
+    check("At most 2 per key", max(peak.values()) <= 2, peak)
+    check("Keys ran concurrently", peak.get("a.com") == 2 and peak.get("b.com") == 2, peak)
+
+def test_priority_order():
+    print("\nTesting priority order...")
+    order = []
+    scheduler = JobScheduler(max_workers=1)
+    gate = threading.Event()
+    scheduler.submit(lambda job: gate.wait(), priority=-1) # Hold the only worker
+    for p in (3, 1, 2, 1):
+        scheduler.submit(lambda job: order.append((job['priority'], job['id'])), priority=p)
+    gate.set()
+    scheduler.wait()
+    check("Lower priority first, FIFO on ties", [p for p, _ in order] == [1, 1, 2, 3], order)
+    ties = [i for p, i in order if p == 1]
+    check("FIFO among equal priorities", ties == sorted(ties), ties)
+
+def test_cancel_and_errors():
+    print("\nTesting cancellation and errors...")
+    started = threading.Event()
+
+    def blocking(job):
+        started.set()
+        return wait_for_cancel(job)
+
+    def failing(job):
+        raise Exception("boom")
+
+    updates = []
+    scheduler = JobScheduler(max_workers=1, on_update=lambda job: updates.append((job['id'], job['status'])))
+    running = scheduler.submit(blocking)
+    queued = scheduler.submit(lambda job: "ran")
+    failed = scheduler.submit(failing)
+    started.wait(2)
+    scheduler.cancel(queued)
+    scheduler.cancel(running)
+    jobs = scheduler.wait()
+
+    check("Queued job cancelled without running", queued['status'] == 'cancelled' and queued['result'] is None, queued['status'])
+    check("Running job saw cancel_event", running['status'] == 'cancelled', running['status'])
+    check("Error captured", failed['status'] == 'error' and "boom" in str(failed['error']), failed['status'])
+    check("wait() returns every job", len(jobs) == 3)
+    check("on_update reported final states", (failed['id'], 'error') in updates, updates)
+
+def test_cancel_all():
+    print("\nTesting cancel_all...")
+    scheduler = JobScheduler(max_workers=1)
+    jobs = [scheduler.submit(wait_for_cancel) for _ in range(4)]
+    time.sleep(0.1)
+    scheduler.cancel_all()
+    start = time.time()
+    scheduler.wait()
+    check("cancel_all stops queued and running jobs", all(j['status'] == 'cancelled' for j in jobs), [j['status'] for j in jobs])
+    check("wait() returns promptly", time.time() - start < 2)
+
+def main():
+    test_per_key_limit()
+    test_priority_order()
+    test_cancel_and_errors()
+    test_cancel_all()
+
+if __name__ == "__main__":
+    main()